@@ -0,0 +1,179 @@
+from execution import Execution
+
+import re
+import threading
+import time
+
+
+
+
+# A tool running a batch brackets the output for each file with these lines,
+# flushing after each:
+#   === BEGIN benchmarks/foo.dop
+#   ... the output the tool prints when run on that file alone ...
+#   === END benchmarks/foo.dop elapsed=0.012 retcode=0
+BEGIN_REGEX = re.compile(r"^=== BEGIN (.*)$")
+
+END_REGEX = re.compile(r"^=== END (.*) elapsed=(\S+) retcode=(-?\d+)$")
+
+
+def begin_marker(filename):
+    return "=== BEGIN {}".format(filename)
+
+
+def end_marker(filename, elapsed, retcode):
+    return "=== END {} elapsed={:.6f} retcode={}".format(filename, elapsed,
+                                                         retcode)
+
+
+
+
+class Batch():
+    '''
+    Runs several tests of one tool in a single invocation to save the tool's
+    startup cost on every file.
+
+    Each file keeps its own time limit: a file still running after its
+    kill_after, or GRACE times the timeout when the test has none, is
+    killed and marked as timed out. A file that takes the tool down with it
+    is marked as crashed. Either way the files after it are run again in a
+    new invocation, and a batch that fails before starting any file is split
+    in two until the failing file runs alone.
+    '''
+    GRACE = 2
+
+    def __init__(self, tests):
+        self.tests = list(tests)
+        self.adapter = self.tests[0].adapter
+        self.mode = self.tests[0].mode
+        self.timeout = self.tests[0].timeout
+        self.execution = None
+        self.report = None
+        self.aborted = False
+        self.lock = threading.Lock()
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            for t in self.tests:
+                t.execution.aborted = True
+            if self.execution is not None:
+                self.execution.abort()
+
+    def set_report(self, report):
+        self.report = report
+
+    def kill_limit(self, t):
+        if t.execution.kill_after is not None:
+            return t.execution.kill_after
+        if self.timeout > 0:
+            return self.GRACE * self.timeout + 5
+        return None
+
+    def run(self, started=None, finished=None):
+        '''
+        Runs every test, calling started and finished with each test as the
+        tool starts and finishes it
+        '''
+        pending = [self.tests]
+        while pending and not self.aborted:
+            group = pending.pop(0)
+            pending = self.run_group(group, started, finished) + pending
+
+    def run_group(self, group, started, finished):
+        ''' Runs one invocation, returns the groups still to be run '''
+        by_path = {t.path : t for t in group}
+        state = {"current" : None, "start" : None, "lines" : [],
+                 "timer" : None, "timed_out" : None, "begun" : set()}
+
+        def kill(t):
+            with self.lock:
+                if state["current"] is t:
+                    state["timed_out"] = t
+                    execution.kill_group()
+
+        def on_line(line):
+            now = time.time()
+            text = line.rstrip("\n")
+            begin = BEGIN_REGEX.match(text)
+            end = END_REGEX.match(text)
+            if begin is not None and begin.group(1) in by_path:
+                t = by_path[begin.group(1)]
+                with self.lock:
+                    state["current"] = t
+                    state["start"] = now
+                    state["lines"] = []
+                    state["begun"].add(t)
+                limit = self.kill_limit(t)
+                if limit is not None:
+                    state["timer"] = threading.Timer(limit, kill, args=(t,))
+                    state["timer"].start()
+                if started is not None:
+                    started(t)
+            elif end is not None and state["current"] is not None:
+                if state["timer"] is not None:
+                    state["timer"].cancel()
+                with self.lock:
+                    t = state["current"]
+                    state["current"] = None
+                t.execution.record("".join(state["lines"]), "",
+                                   float(end.group(2)), int(end.group(3)))
+                t.score_output()
+                if finished is not None:
+                    finished(t)
+            elif state["current"] is not None:
+                state["lines"].append(line)
+
+        command = self.adapter.batch_command([t.path for t in group],
+                                             self.mode, self.timeout)
+        execution = Execution(command, on_line=on_line, report=self.report)
+        with self.lock:
+            if self.aborted:
+                return []
+            self.execution = execution
+        execution.run()
+        if state["timer"] is not None:
+            state["timer"].cancel()
+        if self.aborted:
+            return []
+
+        # The file the tool was working on when it stopped
+        t = state["current"]
+        if t is not None:
+            killed = state["timed_out"] is t
+            retcode = execution.retcode if execution.retcode != 0 else -1
+            t.execution.record("".join(state["lines"]), execution.stderr,
+                               time.time() - state["start"], retcode, killed)
+            if not killed:
+                execution.log("\n".join(["{} crashed its batch".format(t.path),
+                                          execution.command,
+                                          t.execution.stdout,
+                                          t.execution.stderr]))
+            t.score_output()
+            if finished is not None:
+                finished(t)
+
+        rest = [t for t in group if t not in state["begun"]]
+        if rest == []:
+            return []
+        if state["begun"]:
+            return [rest]
+        if len(rest) > 1:
+            half = len(rest) // 2
+            return [rest[:half], rest[half:]]
+
+        # A single file the tool never started, scored from the whole output
+        # as if the tool had run without the batch protocol
+        t = rest[0]
+        if started is not None:
+            started(t)
+        t.execution.record(execution.stdout, execution.stderr,
+                           execution.elapsed, execution.retcode,
+                           execution.killed)
+        if execution.retcode != 0:
+            execution.log("\n".join([execution.command, execution.stdout,
+                                      execution.stderr]))
+        t.score_output()
+        if finished is not None:
+            finished(t)
+        return []
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+
+from dop_file import DopFile
+
+import argparse
+import hashlib
+import os
+import os.path as path
+import sqlite3
+import sys
+
+
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmarks (
+    path           TEXT PRIMARY KEY,
+    family         TEXT,
+    mtime          REAL,
+    size           INTEGER,
+    hash           TEXT,
+    dimension      INTEGER,
+    variables      INTEGER,
+    constraints    INTEGER,
+    expected_min   REAL,
+    min_provenance TEXT,
+    expected_max   REAL,
+    max_provenance TEXT
+);
+CREATE INDEX IF NOT EXISTS benchmarks_family ON benchmarks (family, dimension);
+CREATE TABLE IF NOT EXISTS variables (
+    path     TEXT,
+    position INTEGER,
+    name     TEXT,
+    low      REAL,
+    high     REAL,
+    PRIMARY KEY (path, position)
+);
+"""
+
+
+
+
+class Entry():
+    def __init__(self, row):
+        (self.path, self.family, self.mtime, self.size, self.hash,
+         self.dimension, self.variables, self.constraints,
+         self.expected_min, self.min_provenance,
+         self.expected_max, self.max_provenance) = row
+
+    def expected(self, mode):
+        return self.expected_min if mode == "MIN" else self.expected_max
+
+
+
+
+def prefix_of(root):
+    ''' The prefix of normalized paths below root, empty for "." '''
+    root = path.normpath(root)
+    return "" if root == "." else path.join(root, "")
+
+
+
+
+class Catalog():
+    '''
+    Persistent index of the benchmarks below one or more directories.
+
+    Paths are stored normalized, so "dir" and "./dir/" name the same
+    entries. Files are only re-read when their size or mtime changed, and
+    only re-parsed when their content hash changed.
+    '''
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def scan(self, root):
+        '''
+        Brings the entries below root up to date, returns the number of
+        (added, updated, removed) benchmarks
+        '''
+        cursor = self.connection.cursor()
+        known = dict()
+        prefix = prefix_of(root)
+        # Entries stored unnormalized by older versions are removed below
+        for filename, mtime, size, digest in cursor.execute(
+                "SELECT path, mtime, size, hash FROM benchmarks"):
+            if path.normpath(filename).startswith(prefix):
+                known[filename] = (mtime, size, digest)
+
+        added = 0
+        updated = 0
+        seen = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if not name.endswith(".dop"):
+                    continue
+                filename = path.normpath(path.join(dirpath, name))
+                seen.add(filename)
+                stat = os.stat(filename)
+                old = known.get(filename)
+                if old is not None and old[:2] == (stat.st_mtime, stat.st_size):
+                    continue
+
+                with open(filename, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).hexdigest()
+                if old is not None and old[2] == digest:
+                    cursor.execute("UPDATE benchmarks SET mtime=?, size=? "
+                                   "WHERE path=?",
+                                   (stat.st_mtime, stat.st_size, filename))
+                    continue
+
+                self.add(cursor, filename, data.decode("utf-8"),
+                         stat.st_mtime, stat.st_size, digest)
+                if old is None:
+                    added += 1
+                else:
+                    updated += 1
+
+        removed = [f for f in known if f not in seen]
+        for filename in removed:
+            cursor.execute("DELETE FROM benchmarks WHERE path=?", (filename,))
+            cursor.execute("DELETE FROM variables WHERE path=?", (filename,))
+
+        self.connection.commit()
+        return added, updated, len(removed)
+
+    def add(self, cursor, filename, text, mtime, size, digest):
+        family = path.basename(path.dirname(filename))
+        try:
+            dop = DopFile(text)
+        except ValueError as e:
+            print("WARNING: unable to parse '{}': {}".format(filename, e),
+                  file=sys.stderr)
+            dop = None
+
+        row = [filename, family, mtime, size, digest]
+        if dop is None:
+            row.extend([None]*7)
+        else:
+            row.extend([dop.dimension, len(dop.variables), len(dop.constraints)])
+            for mode in ["MIN", "MAX"]:
+                expected = dop.expected.get(mode)
+                if expected is None:
+                    row.extend([None, None])
+                else:
+                    row.extend([expected.value, expected.provenance])
+
+        cursor.execute("INSERT OR REPLACE INTO benchmarks VALUES "
+                       "(?,?,?,?,?,?,?,?,?,?,?,?)", row)
+        cursor.execute("DELETE FROM variables WHERE path=?", (filename,))
+        if dop is not None:
+            cursor.executemany("INSERT INTO variables VALUES (?,?,?,?,?)",
+                               [(filename, i, name, low, high)
+                                for i, (name, low, high)
+                                in enumerate(dop.variables)])
+
+    def select(self, root=None, family=None, dimension=None,
+               min_dimension=None, max_dimension=None, provenance=None,
+               constrained=None):
+        '''
+        Returns the matching entries sorted by path, every filter is optional
+        '''
+        clauses = list()
+        params = list()
+        if root is not None and prefix_of(root) != "":
+            clauses.append("path LIKE ? ESCAPE '\\'")
+            escaped = prefix_of(root)
+            for c in "\\%_":
+                escaped = escaped.replace(c, "\\" + c)
+            params.append(escaped + "%")
+        if family is not None:
+            clauses.append("family = ?")
+            params.append(family)
+        if dimension is not None:
+            clauses.append("dimension = ?")
+            params.append(dimension)
+        if min_dimension is not None:
+            clauses.append("dimension >= ?")
+            params.append(min_dimension)
+        if max_dimension is not None:
+            clauses.append("dimension <= ?")
+            params.append(max_dimension)
+        if provenance is not None:
+            # Types may be followed by details, as in "provisional, sampled"
+            clauses.append("(min_provenance = ? OR max_provenance = ? "
+                           "OR min_provenance LIKE ? ESCAPE '\\' "
+                           "OR max_provenance LIKE ? ESCAPE '\\')")
+            escaped = provenance
+            for c in "\\%_":
+                escaped = escaped.replace(c, "\\" + c)
+            params.extend([provenance, provenance, escaped + ",%",
+                           escaped + ",%"])
+        if constrained is not None:
+            clauses.append("constraints > 0" if constrained
+                           else "constraints = 0")
+
+        query = "SELECT * FROM benchmarks"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY path"
+        return [Entry(row) for row in self.connection.execute(query, params)]
+
+    def get(self, filename):
+        row = self.connection.execute("SELECT * FROM benchmarks WHERE path=?",
+                                      (path.normpath(filename),)).fetchone()
+        return None if row is None else Entry(row)
+
+    def variables(self, filename):
+        return self.connection.execute(
+            "SELECT name, low, high FROM variables WHERE path=? "
+            "ORDER BY position", (path.normpath(filename),)).fetchall()
+
+
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("catalog",
+                        help="Catalog database file, created if missing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan = subparsers.add_parser("scan",
+                                 help="Incrementally index a benchmark directory")
+    scan.add_argument("benchmark_dir")
+
+    query = subparsers.add_parser("query",
+                                  help="List indexed benchmarks")
+    query.add_argument("--root",
+                       help="Only list benchmarks below this directory",
+                       type=str)
+    query.add_argument("--family",
+                       help="Only list benchmarks from this family (directory name)",
+                       type=str)
+    query.add_argument("--dimension",
+                       help="Only list benchmarks with this many variables",
+                       type=int)
+    query.add_argument("--min-dimension",
+                       type=int)
+    query.add_argument("--max-dimension",
+                       type=int)
+    query.add_argument("--provenance",
+                       help="Only list benchmarks with an expected value of this type, e.g. 'hand solved'",
+                       type=str)
+    query.add_argument("--constrained",
+                       help="Only list benchmarks with constraints",
+                       action='store_const',
+                       const=True,
+                       default=None)
+    query.add_argument("-l",
+                       help="Print all indexed information instead of only paths",
+                       action='store_const',
+                       const=True,
+                       default=False)
+
+    return parser.parse_args(args=argv[1:])
+
+
+def main(argv):
+    args = parse_args(argv)
+    catalog = Catalog(args.catalog)
+
+    if args.command == "scan":
+        added, updated, removed = catalog.scan(args.benchmark_dir)
+        print("added: {}".format(added))
+        print("updated: {}".format(updated))
+        print("removed: {}".format(removed))
+
+    else:
+        entries = catalog.select(root=args.root,
+                                 family=args.family,
+                                 dimension=args.dimension,
+                                 min_dimension=args.min_dimension,
+                                 max_dimension=args.max_dimension,
+                                 provenance=args.provenance,
+                                 constrained=args.constrained)
+        if args.l:
+            print("\t".join(["File", "Family", "Dimension", "Constraints",
+                             "ExpectedMin", "MinType",
+                             "ExpectedMax", "MaxType"]))
+        for e in entries:
+            if args.l:
+                print("\t".join(str(t) for t in [
+                    e.path, e.family, e.dimension, e.constraints,
+                    e.expected_min, e.min_provenance,
+                    e.expected_max, e.max_provenance]))
+            else:
+                print(e.path)
+
+    catalog.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
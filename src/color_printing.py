@@ -21,6 +21,10 @@ def color_printing():
     do_fmt = True
 
 
+def is_color_printing():
+    return do_fmt
+
+
 def fmt(tag, text):
     if do_fmt:
         return tag + text + '\033[0m'
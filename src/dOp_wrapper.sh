@@ -1,3 +1,4 @@
 #!/bin/bash
 
-timeout -k 5 $3 dOp $1
+# usage: dOp_wrapper FILE MODE TIMEOUT [DOP_ARGS...]
+timeout -k 5 $3 dOp $1 "${@:4}"
@@ -0,0 +1,88 @@
+from batch import Batch
+
+import multiprocessing.pool
+import threading
+
+
+
+
+class Dispatcher():
+    '''
+    Runs tests on a pool of threads, each waiting on its own tool process.
+
+    Tests, or Batches of tests, are started in the given order and their TSV
+    rows printed as they complete, through progress when a live status line
+    is shown. With
+    fail_fast set the sweep is aborted, and any running tools killed, once
+    that many failing verdicts have been seen.
+    '''
+    def __init__(self, procs, show_tool=False, fail_fast=0, progress=None):
+        self.procs = procs
+        self.show_tool = show_tool
+        self.fail_fast = fail_fast
+        self.progress = progress
+        self.failures = 0
+        self.aborted = False
+        self.running = set()
+        self.lock = threading.Lock()
+        self.output_lock = threading.Lock()
+
+    def run(self, units):
+        if self.progress is not None:
+            self.progress.start()
+        with multiprocessing.pool.ThreadPool(processes=self.procs) as pool:
+            try:
+                for _ in pool.imap_unordered(self.run_unit, units):
+                    pass
+            except KeyboardInterrupt as e:
+                self.abort()
+                raise e
+            finally:
+                if self.progress is not None:
+                    self.progress.stop()
+
+    def run_unit(self, unit):
+        with self.lock:
+            if self.aborted:
+                return
+            self.running.add(unit)
+        unit.set_report(self.report)
+        if isinstance(unit, Batch):
+            unit.run(self.started, self.completed)
+        else:
+            self.started(unit)
+            unit.run()
+            if not unit.execution.aborted:
+                self.completed(unit)
+        with self.lock:
+            self.running.discard(unit)
+
+    def started(self, t):
+        if self.progress is not None:
+            self.progress.started(t)
+
+    def completed(self, t):
+        # Called from the worker threads
+        with self.output_lock:
+            if self.progress is not None:
+                self.progress.finished(t, t.tsv_row(self.show_tool))
+            else:
+                print(t.tsv_row(self.show_tool), flush=True)
+            self.failures += t.failures()
+            if self.fail_fast > 0 and self.failures >= self.fail_fast:
+                self.abort()
+
+    def report(self, text):
+        # Diagnostics from the worker threads, kept clear of the TSV rows
+        # and the status line
+        with self.output_lock:
+            if self.progress is not None:
+                self.progress.message(text)
+            else:
+                print(text, flush=True)
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            for unit in self.running:
+                unit.abort()
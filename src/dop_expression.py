@@ -0,0 +1,224 @@
+import re
+
+
+
+
+TOKEN_REGEX = re.compile(r"""
+    \s*(?:
+      (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+    | (?P<op><=|>=|==|&&|\|\||[-+*/^(),\[\]<>=])
+    )""", re.VERBOSE)
+
+FUNCTIONS = {
+    "abs",
+    "atan",
+    "cos",
+    "exp",
+    "log",
+    "pow",
+    "sin",
+    "sqrt",
+    "tan",
+}
+
+CONSTANTS = {
+    "pi",
+}
+
+# "==" is accepted as a spelling of "="
+COMPARISONS = {
+    "<",
+    "<=",
+    ">",
+    ">=",
+    "=",
+}
+
+
+
+
+class ParseError(ValueError):
+    pass
+
+
+
+
+def tokenize(text):
+    tokens = list()
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_REGEX.match(text, position)
+        if match is None or match.end() == position:
+            raise ParseError("Unexpected character {!r} in '{}'".format(
+                text[position], text))
+        position = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+
+
+class Parser():
+    '''
+    Recursive descent parser for dOp expressions.
+
+    Expressions become nested tuples with the operator first:
+      ("const", 2.0)  ("var", "x")  ("interval", 1.0, 2.0)
+      ("+", a, b)  ("-", a, b)  ("*", a, b)  ("/", a, b)  ("^", a, b)
+      ("neg", a)  ("sin", a)  ("pow", a, b)  ...
+
+    Constraints additionally use comparisons and logical connectives:
+      ("<=", a, b)  ("=", a, b)  ...  ("&&", a, b)  ("||", a, b)
+    '''
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        kind, found = self.next()
+        if found != value:
+            raise ParseError("Expected '{}' but found '{}' in '{}'".format(
+                value, found, self.text))
+
+    def parse(self, constraint=False):
+        expr = self.parse_or() if constraint else self.parse_sum()
+        if self.peek() != (None, None):
+            raise ParseError("Trailing input '{}' in '{}'".format(
+                self.peek()[1], self.text))
+        return expr
+
+    def parse_or(self):
+        expr = self.parse_and()
+        while self.peek() == ("op", "||"):
+            self.next()
+            expr = ("||", expr, self.parse_and())
+        return expr
+
+    def parse_and(self):
+        expr = self.parse_comparison()
+        while self.peek() == ("op", "&&"):
+            self.next()
+            expr = ("&&", expr, self.parse_comparison())
+        return expr
+
+    def parse_comparison(self):
+        expr = self.parse_sum()
+        kind, op = self.peek()
+        if kind == "op" and (op in COMPARISONS or op == "=="):
+            self.next()
+            op = "=" if op == "==" else op
+            expr = (op, expr, self.parse_sum())
+        return expr
+
+    def parse_sum(self):
+        expr = self.parse_product()
+        while self.peek() in {("op", "+"), ("op", "-")}:
+            op = self.next()[1]
+            expr = (op, expr, self.parse_product())
+        return expr
+
+    def parse_product(self):
+        expr = self.parse_unary()
+        while self.peek() in {("op", "*"), ("op", "/")}:
+            op = self.next()[1]
+            expr = (op, expr, self.parse_unary())
+        return expr
+
+    def parse_unary(self):
+        if self.peek() == ("op", "-"):
+            self.next()
+            return ("neg", self.parse_unary())
+        if self.peek() == ("op", "+"):
+            self.next()
+            return self.parse_unary()
+        return self.parse_power()
+
+    def parse_power(self):
+        # "^" is right associative and binds tighter than unary minus
+        base = self.parse_atom()
+        if self.peek() == ("op", "^"):
+            self.next()
+            return ("^", base, self.parse_unary())
+        return base
+
+    def parse_atom(self):
+        kind, value = self.next()
+        if kind == "number":
+            return ("const", float(value))
+        if kind == "name":
+            if self.peek() == ("op", "("):
+                self.next()
+                args = [self.parse_sum()]
+                while self.peek() == ("op", ","):
+                    self.next()
+                    args.append(self.parse_sum())
+                self.expect(")")
+                return (value,) + tuple(args)
+            return ("var", value)
+        if value == "(":
+            # Parenthesized constraints such as "(a > 1) || (b > 0)" are
+            # parsed here as well
+            expr = self.parse_or()
+            self.expect(")")
+            return expr
+        if value == "[":
+            low = self.parse_sum()
+            self.expect(",")
+            high = self.parse_sum()
+            self.expect("]")
+            return ("interval", constant_value(low), constant_value(high))
+        raise ParseError("Unexpected '{}' in '{}'".format(value, self.text))
+
+
+
+
+def constant_value(expr):
+    if expr[0] == "const":
+        return expr[1]
+    if expr[0] == "neg" and expr[1][0] == "const":
+        return -expr[1][1]
+    raise ParseError("Interval bounds must be numbers")
+
+
+def parse_expression(text):
+    return Parser(text).parse()
+
+
+def parse_constraint(text):
+    return Parser(text).parse(constraint=True)
+
+
+def children(expr):
+    if expr[0] in {"const", "var", "interval"}:
+        return ()
+    return expr[1:]
+
+
+def walk(expr):
+    ''' Yields every node of the expression, parents before children '''
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(children(node)))
+
+
+def depth(expr):
+    kids = children(expr)
+    if kids == ():
+        return 1
+    return 1 + max(depth(k) for k in kids)
@@ -0,0 +1,155 @@
+import re
+
+
+
+
+SECTION_REGEX = re.compile(r"^[ \t]*(var|cost|ctr|prec)[ \t]*:[ \t]*(.*)$",
+                           re.MULTILINE)
+
+EXPECTED_REGEX = re.compile(r"^\#[ \t]*(minimum|maximum):[ \t]*([^ \n]+)(.*)$",
+                            re.MULTILINE)
+
+TYPE_REGEX = re.compile(r"^\#[ \t]*type:[ \t]*(.*?)[ \t]*$")
+
+INPUT_REGEX = re.compile(r"^\#[ \t]*input:[ \t]*(.*?)[ \t]*$")
+
+# Both "[low, high] name;" and "name = [low, high];" are in use
+VAR_REGEXES = [
+    re.compile(r"^\[([^,\]]+),([^\]]+)\][ \t]*([A-Za-z_][A-Za-z_0-9]*)$"),
+    re.compile(r"^([A-Za-z_][A-Za-z_0-9]*)[ \t]*=[ \t]*\[([^,\]]+),([^\]]+)\]$"),
+]
+
+
+
+
+class DopFile():
+    '''
+    The parsed contents of a .dop benchmark.
+
+    expected maps "MIN"/"MAX" to an Expected for each "# minimum:" and
+    "# maximum:" header present in the file.
+    '''
+    MODE_HEADERS = {
+        "minimum" : "MIN",
+        "maximum" : "MAX",
+    }
+
+    def __init__(self, text):
+        text = text.replace("\r\n", "\n")
+        self.expected = dict()
+        self.variables = list()
+        self.cost = list()
+        self.constraints = list()
+        self.prec = None
+
+        self.parse_header(text)
+        self.parse_sections(text)
+
+    def parse_header(self, text):
+        lines = text.split("\n")
+        for match in EXPECTED_REGEX.finditer(text):
+            mode = self.MODE_HEADERS[match.group(1)]
+            if mode in self.expected:
+                continue
+            try:
+                value = float(match.group(2))
+            except ValueError:
+                continue
+            note = match.group(3).strip()
+
+            # The "type:" and "input:" lines belong to the comment block
+            # directly below the value
+            provenance = None
+            inputs = None
+            line_number = text.count("\n", 0, match.start()) + 1
+            for line in lines[line_number:]:
+                if not line.startswith("#") or EXPECTED_REGEX.match(line):
+                    break
+                type_match = TYPE_REGEX.match(line)
+                if type_match is not None:
+                    provenance = type_match.group(1)
+                input_match = INPUT_REGEX.match(line)
+                if input_match is not None:
+                    inputs = input_match.group(1)
+            if provenance is None and "provisional" in note:
+                provenance = "provisional"
+
+            self.expected[mode] = Expected(value, provenance, inputs, note)
+
+    def parse_sections(self, text):
+        matches = list(SECTION_REGEX.finditer(text))
+        for i, match in enumerate(matches):
+            end = matches[i+1].start() if i+1 < len(matches) else len(text)
+            body = match.group(2) + "\n" + text[match.end():end]
+            body = "\n".join(line for line in body.split("\n")
+                             if not line.lstrip().startswith("#"))
+            section = match.group(1)
+
+            if section == "prec":
+                self.prec = float(body.strip())
+                continue
+
+            items = [" ".join(item.split()) for item in body.split(";")]
+            items = [item for item in items if item != ""]
+            if section == "var":
+                self.variables.extend(parse_variable(item) for item in items)
+            elif section == "cost":
+                self.cost.extend(items)
+            else:
+                self.constraints.extend(items)
+
+    @property
+    def free_variables(self):
+        # Point intervals, such as the enclosures used for pi, are constants
+        return [v for v in self.variables
+                if v[2] - v[1] > 1e-12*max(1.0, abs(v[1]), abs(v[2]))]
+
+    @property
+    def dimension(self):
+        return len(self.free_variables)
+
+    def expected_value(self, mode):
+        expected = self.expected.get(mode)
+        return None if expected is None else expected.value
+
+
+
+
+class Expected():
+    def __init__(self, value, provenance, inputs, note):
+        self.value = value
+        self.provenance = provenance
+        self.inputs = inputs
+        self.note = note
+
+
+
+
+def parse_variable(item):
+    for i, regex in enumerate(VAR_REGEXES):
+        match = regex.match(item)
+        if match is None:
+            continue
+        if i == 0:
+            low, high, name = match.groups()
+        else:
+            name, low, high = match.groups()
+        return (name, float(low), float(high))
+    raise ValueError("Unable to parse variable: '{}'".format(item))
+
+
+def expected_header(mode, value, provenance, inputs):
+    '''
+    Lines of a "# minimum:"/"# maximum:" comment block, inputs is a list of
+    (variable name, value) pairs witnessing the value
+    '''
+    header = "minimum" if mode == "MIN" else "maximum"
+    return ["# {}: {}".format(header, repr(float(value) + 0.0)),
+            "#    type: {}".format(provenance),
+            "#   input: {}".format(" ".join("{}={}".format(name, repr(float(x)))
+                                            for name, x in inputs))]
+
+
+def read_dop(filename):
+    with open(filename, "r") as f:
+        return DopFile(f.read())
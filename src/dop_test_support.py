@@ -1,10 +1,7 @@
-import re
+from tool_adapter import DopAdapter
 
 def get_result(output):
-    match = re.findall(r'min_\d+ += +\[([^,]+), +[^\]]+\]', output)
-    if match != []:
-        res = sum([float(m) for m in match])
-        return res, res
-    else:
+    result = DopAdapter().parse_output(output, "MIN")
+    if result == (None, None):
         print(output)
-        return None, None
+    return result
@@ -2,28 +2,136 @@
 
 import os
 import shlex
+import signal
 import subprocess
 import sys
+import threading
 import time
 
 
 
 class Execution():
-    def __init__(self, command):
+    '''
+    Runs one tool command. With on_line set, each line of stdout is passed
+    to it as it arrives, for tools that report on several benchmarks in one
+    run; failures are then left to the caller to report. Diagnostics go to
+    report when it is set, so they do not clash with a live status line.
+    '''
+    def __init__(self, command, kill_after=None, on_line=None, report=None):
         self.command = command
+        self.kill_after = kill_after
+        self.on_line = on_line
+        self.report = report
+        self.killed = False
+        self.aborted = False
+        self.process = None
         self.elapsed = None
         self.retval = None
         self.stdout = None
         self.stderr = None
+        self.max_rss = None
         self.has_run = False
+        self.reaped = False
+        self.lock = threading.Lock()
+
+    def kill_group(self):
+        # Once the tool is reaped its pid, and so the group id, may be reused
+        with self.lock:
+            if self.reaped:
+                return
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def log(self, text, stream=sys.stdout):
+        if self.report is not None:
+            self.report(text)
+        else:
+            print(text, file=stream, flush=True)
+
+    def abort(self):
+        '''
+        Stops the command if it is running and prevents it from starting,
+        safe to call from another thread
+        '''
+        self.aborted = True
+        if self.process is not None:
+            self.kill_group()
+
+    def record(self, stdout, stderr, elapsed, retcode, killed=False):
+        '''
+        Fills in the results of a run made elsewhere, such as one file of a
+        batch
+        '''
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.retcode = retcode
+        self.killed = killed
+        self.has_run = True
+
+    def timed_out(self):
+        self.killed = True
+        self.kill_group()
+
+    def wait(self, p):
+        '''
+        Waits for the tool with wait4 rather than communicate, so that its
+        resource usage can be kept. Returns (stdout, stderr) as bytes.
+        '''
+        outputs = dict()
+        def read(name, stream):
+            if name == "out" and self.on_line is not None:
+                lines = list()
+                for line in stream:
+                    lines.append(line)
+                    self.on_line(line.decode('utf-8'))
+                outputs[name] = b"".join(lines)
+            else:
+                outputs[name] = stream.read()
+            stream.close()
+        readers = [threading.Thread(target=read, args=(name, stream))
+                   for name, stream in [("out", p.stdout), ("err", p.stderr)]]
+        for r in readers:
+            r.start()
+
+        timer = None
+        if self.kill_after is not None:
+            timer = threading.Timer(self.kill_after, self.timed_out)
+            timer.start()
+        # Wait for the tool to exit without reaping it, so that children it
+        # left behind, which may still hold the pipes open, can be killed by
+        # group while its pid is still taken
+        os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)
+        if timer is not None:
+            timer.cancel()
+        self.kill_group()
+        with self.lock:
+            _, status, usage = os.wait4(p.pid, 0)
+            self.reaped = True
+        p.returncode = os.waitstatus_to_exitcode(status)
+        for r in readers:
+            r.join()
+
+        # Covers the tool and any descendants it waited for, in kilobytes
+        self.max_rss = usage.ru_maxrss
+        return outputs["out"], outputs["err"]
 
     def run(self):
         try:
             start_time = time.time()
+            # The tool runs in its own process group so that it can be killed
+            # along with anything it starts, wrappers such as dOp_wrapper
+            # leave the real tool as a grandchild
             p = subprocess.Popen(shlex.split(self.command),
                                  stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            out, err  = p.communicate()
+                                 stderr=subprocess.PIPE,
+                                 start_new_session=True)
+            self.process = p
+            if self.aborted:
+                self.kill_group()
+            out, err = self.wait(p)
             end_time = time.time()
             self.elapsed = end_time - start_time
             self.stdout = out.decode('utf-8')
@@ -31,10 +139,9 @@ class Execution():
             self.retcode = p.returncode
             self.has_run = True
 
-            if self.retcode != 0:
-                print(self.command)
-                print(self.stdout)
-                print(self.stderr)
+            if (self.retcode != 0 and not (self.killed or self.aborted)
+                and self.on_line is None):
+                self.log("\n".join([self.command, self.stdout, self.stderr]))
         except Exception as e:
             exc_type, exc_obj, exc_tb = sys.exc_info()
             fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
@@ -55,5 +162,5 @@ class Execution():
             except:
                 pass
 
-            print("\n".join(err), file=sys.stderr)
+            self.log("\n".join(err), sys.stderr)
             sys.exit(1)
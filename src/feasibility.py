@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+
+
+from dop_expression import parse_constraint, parse_expression, walk
+from dop_file import expected_header, read_dop
+
+import argparse
+import glob
+import os.path as path
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+
+FUNCTIONS = {
+    "abs"  : lambda a : np.abs(a),
+    "atan" : lambda a : np.arctan(a),
+    "cos"  : lambda a : np.cos(a),
+    "exp"  : lambda a : np.exp(a),
+    "log"  : lambda a : np.log(a),
+    "pow"  : lambda a, b : np.power(a, b),
+    "sin"  : lambda a : np.sin(a),
+    "sqrt" : lambda a : np.sqrt(a),
+    "tan"  : lambda a : np.tan(a),
+}
+
+# Values this large come from the objective overflowing somewhere in the box
+# and are not useful as expected values
+OVERFLOW = 1e300
+
+# Added to the violation of a strict comparison that holds with equality
+TINY = sys.float_info.min
+
+# Constraints with more alternatives than this are searched as one branch
+MAX_BRANCHES = 64
+
+MIN_BRANCH_BATCH = 10000
+
+BINARY_OPS = {
+    "+" : lambda a, b : a + b,
+    "-" : lambda a, b : a - b,
+    "*" : lambda a, b : a * b,
+    "/" : lambda a, b : a / b,
+    "^" : lambda a, b : np.power(a, b),
+}
+
+
+
+
+def variables_of(expr):
+    return {node[1] for node in walk(expr) if node[0] == "var"}
+
+
+def signed_terms(expr, sign=1):
+    ''' Flattens a sum into a list of (sign, term) pairs '''
+    if expr[0] == "+":
+        return signed_terms(expr[1], sign) + signed_terms(expr[2], sign)
+    if expr[0] == "-":
+        return signed_terms(expr[1], sign) + signed_terms(expr[2], -sign)
+    if expr[0] == "neg":
+        return signed_terms(expr[1], -sign)
+    return [(sign, expr)]
+
+
+def scaled_variable(term):
+    ''' (name, coefficient) when a term is a variable times a number '''
+    if term[0] == "var":
+        return term[1], 1.0
+    if term[0] == "*":
+        for a, b in [(term[1], term[2]), (term[2], term[1])]:
+            if a[0] == "const" and a[1] != 0 and b[0] == "var":
+                return b[1], a[1]
+    if (term[0] == "/" and term[1][0] == "var" and term[2][0] == "const"
+        and term[2][1] != 0):
+        return term[1][1], 1 / term[2][1]
+    return None
+
+
+def build_sum(terms):
+    expr = ("const", 0.0)
+    for sign, term in terms:
+        expr = ("+" if sign > 0 else "-", expr, term)
+    return expr
+
+
+def evaluate(expr, env):
+    '''
+    Evaluates an expression over a batch, env maps variable names to arrays
+    '''
+    op = expr[0]
+    if op == "const":
+        return expr[1]
+    if op == "var":
+        if expr[1] not in env and expr[1] == "pi":
+            return np.pi
+        return env[expr[1]]
+    if op == "interval":
+        return (expr[1] + expr[2]) / 2
+    if op == "neg":
+        return -evaluate(expr[1], env)
+    if op in BINARY_OPS:
+        return BINARY_OPS[op](evaluate(expr[1], env), evaluate(expr[2], env))
+    if op in FUNCTIONS:
+        return FUNCTIONS[op](*[evaluate(e, env) for e in expr[1:]])
+    raise ValueError("Unable to evaluate '{}'".format(op))
+
+
+def violation(expr, env):
+    '''
+    How far each point of the batch is from satisfying a constraint, zero
+    only where it holds exactly, so strict comparisons are violated at
+    equality
+    '''
+    op = expr[0]
+    if op == "&&":
+        return violation(expr[1], env) + violation(expr[2], env)
+    if op == "||":
+        return np.minimum(violation(expr[1], env), violation(expr[2], env))
+    if op not in {"<", "<=", ">", ">=", "="}:
+        raise ValueError("Constraint expected, found '{}'".format(op))
+    a = evaluate(expr[1], env)
+    b = evaluate(expr[2], env)
+    if op == "<=":
+        return np.where(a <= b, 0.0, a - b)
+    if op == "<":
+        return np.where(a < b, 0.0, a - b + TINY)
+    if op == ">=":
+        return np.where(a >= b, 0.0, b - a)
+    if op == ">":
+        return np.where(a > b, 0.0, b - a + TINY)
+    return np.where(a == b, 0.0, np.abs(a - b))
+
+
+def disjuncts(expr):
+    ''' A constraint as a list of alternatives, each a list of comparisons '''
+    if expr[0] == "||":
+        return disjuncts(expr[1]) + disjuncts(expr[2])
+    if expr[0] == "&&":
+        return [a + b for a in disjuncts(expr[1]) for b in disjuncts(expr[2])]
+    return [[expr]]
+
+
+def branches(constraints):
+    '''
+    Splits a list of constraints, all of which must hold, into alternative
+    lists of comparisons. Each branch can then be searched on its own, with
+    equalities in it solved for a variable. Past MAX_BRANCHES the
+    constraints are kept whole as a single branch.
+    '''
+    result = [[]]
+    for c in constraints:
+        result = [a + b for a in result for b in disjuncts(c)]
+        if len(result) > MAX_BRANCHES:
+            return [list(constraints)]
+    return result
+
+
+
+
+class Problem():
+    '''
+    One branch of a constrained benchmark prepared for batch evaluation.
+
+    Equality constraints which can be solved for a variable, such as
+    "y1 = f(x1, x2)", "c = 2" or "a*x1 + x2 - b*x3 = c", are used to compute
+    that variable instead of sampling it, leaving only its box to be
+    checked. All other constraints are measured by how far a point is from
+    satisfying them exactly.
+    '''
+    def __init__(self, dop, constraints):
+        self.names = [name for name, low, high in dop.variables]
+        self.boxes = {name : (low, high) for name, low, high in dop.variables}
+        free = {name for name, low, high in dop.free_variables}
+        self.witnessed = [name for name in self.names if name in free]
+
+        self.cost = [parse_expression(c) for c in dop.cost]
+        self.definitions, self.constraints = self.split_definitions(
+            constraints, free)
+        defined = {name for name, expr in self.definitions}
+        self.sampled = [name for name in self.names if name not in defined]
+
+    @staticmethod
+    def solve_for(constraint, free, taken):
+        '''
+        If an equality is a sum with a free variable, or a variable times a
+        number, as one of its terms, and that variable appears nowhere else
+        in it, returns (variable, the expression it equals). Returns None
+        otherwise.
+        '''
+        terms = signed_terms(constraint[1]) + signed_terms(constraint[2], -1)
+        counts = dict()
+        for sign, term in terms:
+            for node in walk(term):
+                if node[0] == "var":
+                    counts[node[1]] = counts.get(node[1], 0) + 1
+        for i, (sign, term) in enumerate(terms):
+            scaled = scaled_variable(term)
+            if scaled is None:
+                continue
+            name, coefficient = scaled
+            if name in free and name not in taken and counts[name] == 1:
+                others = [(-sign*s, t) for s, t in terms[:i] + terms[i+1:]]
+                expr = build_sum(others)
+                if coefficient != 1.0:
+                    expr = ("/", expr, ("const", coefficient))
+                return name, expr
+        return None
+
+    @classmethod
+    def split_definitions(cls, constraints, free):
+        candidates = dict()
+        remaining = list()
+        for c in constraints:
+            solved = None
+            if c[0] == "=":
+                solved = cls.solve_for(c, free, candidates)
+            if solved is None:
+                remaining.append(c)
+            else:
+                candidates[solved[0]] = (c, solved[1])
+
+        # Definitions may use each other, they are evaluated in dependency
+        # order and any left in a cycle are kept as constraints
+        definitions = list()
+        while True:
+            ready = [name for name, (c, expr) in candidates.items()
+                     if not variables_of(expr) & set(candidates)]
+            if ready == []:
+                break
+            for name in sorted(ready):
+                definitions.append((name, candidates.pop(name)[1]))
+        remaining.extend(c for c, expr in candidates.values())
+        return definitions, remaining
+
+    def evaluate(self, points):
+        '''
+        points is an array with a column per sampled variable. Returns the
+        (objective, violation, env) of each point, points where anything is
+        NaN or the objective is infinite count as infeasible.
+        '''
+        with np.errstate(all="ignore"):
+            env = {name : points[:, i] for i, name in enumerate(self.sampled)}
+            total = np.zeros(len(points))
+            for name, expr in self.definitions:
+                value = np.broadcast_to(evaluate(expr, env), total.shape)
+                env[name] = value
+                low, high = self.boxes[name]
+                total = total + np.maximum(low - value, 0.0)
+                total = total + np.maximum(value - high, 0.0)
+            for c in self.constraints:
+                total = total + violation(c, env)
+            objective = np.zeros(len(points))
+            for c in self.cost:
+                objective = objective + evaluate(c, env)
+        total = np.where(np.isnan(total) | ~np.isfinite(objective), np.inf,
+                         total)
+        return objective, total, env
+
+
+
+
+class Sampler():
+    '''
+    Searches for the best feasible point of a Problem in batches: a uniform
+    sample of the box, then rounds of sampling around the best points found
+    so far, with part of every round kept uniform. Half of the points around
+    the best ones move a single coordinate, which reaches optima on the
+    faces and corners of the box. The neighbourhood shrinks only after a
+    round without improvement, and grows again after one that improves.
+
+    Points are ranked by violation first and objective second, so the search
+    is drawn towards thin feasible regions before any point is feasible.
+    '''
+    def __init__(self, problem, batch=100000, rounds=30, elite=32, seed=None):
+        self.problem = problem
+        self.batch = batch
+        self.rounds = rounds
+        self.elite = elite
+        self.rng = np.random.default_rng(seed)
+        boxes = [problem.boxes[name] for name in problem.sampled]
+        self.low = np.array([low for low, high in boxes])
+        self.high = np.array([high for low, high in boxes])
+
+    def uniform(self, count):
+        return self.rng.uniform(self.low, self.high,
+                                (count, len(self.low)))
+
+    def rank(self, points, objective, violation, maximize):
+        feasible = violation == 0.0
+        score = np.where(feasible, -objective if maximize else objective,
+                         np.inf)
+        order = np.lexsort((score, np.where(feasible, 0.0, violation)))
+        return points[order], objective[order], violation[order]
+
+    def around(self, centers, scale):
+        count = (3 * self.batch // 4) // len(centers)
+        centers = np.repeat(centers, count, axis=0)
+        steps = self.rng.uniform(-1.0, 1.0, centers.shape)
+        steps = steps * scale * (self.high - self.low)
+        single = np.zeros(centers.shape, dtype=bool)
+        single[np.arange(len(centers)),
+               self.rng.integers(0, centers.shape[1], len(centers))] = True
+        single[1::2] = True
+        return np.clip(centers + steps*single, self.low, self.high)
+
+    def search(self, maximize):
+        '''
+        Returns (objective, violation, point) of the best point found and the
+        fraction of the first uniform batch that was feasible
+        '''
+        points = self.uniform(self.batch)
+        objective, violation, _ = self.problem.evaluate(points)
+        feasible_fraction = float(np.mean(violation == 0.0))
+        points, objective, violation = self.rank(points, objective,
+                                                 violation, maximize)
+        best = (points[:self.elite], objective[:self.elite],
+                violation[:self.elite])
+
+        scale = 0.1
+        for _ in range(self.rounds):
+            if len(self.low) == 0:
+                break
+            local = self.around(best[0], scale)
+            points = np.concatenate([best[0], local,
+                                     self.uniform(self.batch - len(local))])
+            objective, violation, _ = self.problem.evaluate(points)
+            points, objective, violation = self.rank(points, objective,
+                                                     violation, maximize)
+            previous = (best[2][0], best[1][0])
+            best = (points[:self.elite], objective[:self.elite],
+                    violation[:self.elite])
+            if self.improved(previous, (best[2][0], best[1][0]), maximize):
+                scale = min(2 * scale, 0.25)
+            else:
+                scale = scale / 4
+
+        return (float(best[1][0]), float(best[2][0]), best[0][0:1],
+                feasible_fraction)
+
+    @staticmethod
+    def improved(old, new, maximize):
+        ''' Whether (violation, objective) new ranks above old '''
+        if new[0] != old[0]:
+            return new[0] < old[0]
+        if new[0] != 0.0:
+            return False
+        return new[1] > old[1] if maximize else new[1] < old[1]
+
+    def witness(self, point):
+        ''' (name, value) pairs of every free variable at a sampled point '''
+        _, _, env = self.problem.evaluate(point)
+        return [(name, float(np.asarray(env[name]).reshape(-1)[0]))
+                for name in self.problem.witnessed]
+
+
+
+
+def best_point(problems, mode, batch, rounds, seed):
+    '''
+    Searches every branch for a mode. Returns (value, witness, feasible
+    fraction of the best branch, number of branches with a feasible point),
+    value is None when no branch has one.
+    '''
+    maximize = mode == "MAX"
+    best = None
+    fraction = 0.0
+    feasible = 0
+    branch_batch = max(batch // len(problems), MIN_BRANCH_BATCH)
+    for i, problem in enumerate(problems):
+        sampler = Sampler(problem, branch_batch, rounds, seed=[seed, i])
+        value, worst, point, branch_fraction = sampler.search(maximize)
+        fraction = max(fraction, branch_fraction)
+        if worst > 0.0:
+            continue
+        feasible += 1
+        if (best is None or (value > best[0] if maximize
+                             else value < best[0])):
+            best = (value, sampler.witness(point))
+    if best is None:
+        return None, None, fraction, feasible
+    return best[0], best[1], fraction, feasible
+
+
+
+
+def find_files(targets):
+    files = list()
+    for target in targets:
+        if path.isdir(target):
+            files.extend(sorted(glob.glob(path.join(target, "**", "*.dop"),
+                                          recursive=True)))
+        else:
+            files.append(target)
+    return files
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Estimate optima of constrained benchmarks by batched sampling, writing them as provisional headers")
+    parser.add_argument("--batch",
+                        help="Points evaluated per batch, shared between the branches of disjunctive constraints",
+                        type=int,
+                        default=100000)
+    parser.add_argument("--rounds",
+                        help="Refinement rounds after the first uniform batch",
+                        type=int,
+                        default=30)
+    parser.add_argument("--seed",
+                        help="First random seed, for reproducible headers",
+                        type=int,
+                        default=0)
+    parser.add_argument("--seeds",
+                        help="Number of seeds to search with, the spread of their results is reported",
+                        type=int,
+                        default=3)
+    parser.add_argument("--mode",
+                        help="Only estimate this mode, default is both",
+                        choices=["MIN", "MAX"],
+                        action="append")
+    parser.add_argument("--dry-run",
+                        help="Print the headers instead of writing them",
+                        action='store_const',
+                        const=True,
+                        default=False)
+    parser.add_argument("benchmarks",
+                        help="Benchmark files or directories",
+                        nargs="+")
+
+    args = parser.parse_args(args=argv[1:])
+    if args.mode is None:
+        args.mode = ["MIN", "MAX"]
+    if args.seeds < 1:
+        parser.error("--seeds must be at least 1")
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    if np is None:
+        print("feasibility requires NumPy, install it with 'pip install numpy'")
+        return 1
+
+    print("\t".join(["Benchmark", "Mode", "Value", "Spread", "Seeds",
+                     "Branches", "FeasibleFraction", "Action"]))
+    for filename in find_files(args.benchmarks):
+        with open(filename, "r") as f:
+            text = f.read()
+        try:
+            dop = read_dop(filename)
+            constraints = [parse_constraint(c) for c in dop.constraints]
+            problems = [Problem(dop, b) for b in branches(constraints)]
+        except ValueError as e:
+            print("{}\t-\t-\t-\t-\t-\t-\tunable to parse: {}".format(filename, e))
+            continue
+
+        lines = list()
+        for mode in args.mode:
+            if mode in dop.expected:
+                print("{}\t{}\t{}\t-\t-\t-\t-\tkept existing".format(
+                    filename, mode, dop.expected[mode].value))
+                continue
+            results = [best_point(problems, mode, args.batch, args.rounds, seed)
+                       for seed in range(args.seed, args.seed + args.seeds)]
+            found = [r for r in results if r[0] is not None]
+            fraction = max(r[2] for r in results)
+            branch_count = "{}/{}".format(max(r[3] for r in results),
+                                          len(problems))
+            if found == []:
+                print("{}\t{}\t-\t-\t0/{}\t{}\t{:.3g}\tno feasible point found".format(
+                    filename, mode, args.seeds, branch_count, fraction))
+                continue
+            values = [r[0] for r in found]
+            best = (max if mode == "MAX" else min)(found, key=lambda r: r[0])
+            spread = max(values) - min(values)
+            seeds = "{}/{}".format(len(found), args.seeds)
+            if not abs(best[0]) < OVERFLOW:
+                print("{}\t{}\t{}\t-\t{}\t{}\t{:.3g}\tobjective overflows".format(
+                    filename, mode, best[0], seeds, branch_count, fraction))
+                continue
+            print("{}\t{}\t{}\t{:.3g}\t{}\t{}\t{:.3g}\t{}".format(
+                filename, mode, best[0], spread, seeds, branch_count, fraction,
+                "would write" if args.dry_run else "written"))
+            # The value is attained at the witness, so it can only be
+            # less extreme than the true optimum
+            provenance = "provisional, sampled, {} seeds feasible, spread {:.3g}".format(
+                seeds, spread)
+            lines.extend(expected_header(mode, best[0], provenance, best[1]))
+            lines.append("")
+
+        if lines == []:
+            continue
+        if args.dry_run:
+            print("\n".join(lines))
+            continue
+        with open(filename, "w") as f:
+            f.write("\n".join(lines) + "\n" + text)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+
+
+from dop_expression import children, depth, parse_expression, walk
+from dop_file import read_dop
+from regression_file import read_regressionfile
+
+import argparse
+import hashlib
+import json
+import math
+import statistics
+import sys
+
+
+
+
+BENCHMARK_FEATURES = [
+    "variables",
+    "dimension",
+    "mean_log_width",
+    "max_log_width",
+    "cost_terms",
+    "constraints",
+    "nodes",
+    "depth",
+    "arithmetic",
+    "divisions",
+    "powers",
+    "transcendentals",
+    "sqrt_abs",
+    "intervals",
+    "repeated_subexpressions",
+]
+
+# Features describing how the benchmark is run rather than the benchmark
+RUN_FEATURES = [
+    "log_timeout",
+    "min_mode",
+]
+
+OPERATOR_FEATURES = {
+    "+"    : "arithmetic",
+    "-"    : "arithmetic",
+    "*"    : "arithmetic",
+    "neg"  : "arithmetic",
+    "/"    : "divisions",
+    "^"    : "powers",
+    "pow"  : "powers",
+    "sin"  : "transcendentals",
+    "cos"  : "transcendentals",
+    "tan"  : "transcendentals",
+    "exp"  : "transcendentals",
+    "log"  : "transcendentals",
+    "atan" : "transcendentals",
+    "sqrt" : "sqrt_abs",
+    "abs"  : "sqrt_abs",
+    "interval" : "intervals",
+}
+
+
+
+
+def extract_features(dop):
+    '''
+    Static features of a parsed .dop file, see BENCHMARK_FEATURES
+    '''
+    features = {k:0 for k in BENCHMARK_FEATURES}
+    features["variables"] = len(dop.variables)
+    features["dimension"] = dop.dimension
+    features["cost_terms"] = len(dop.cost)
+    features["constraints"] = len(dop.constraints)
+
+    log_widths = [math.log10(high - low)
+                  for name, low, high in dop.free_variables
+                  if not math.isinf(high - low)]
+    if log_widths:
+        features["mean_log_width"] = statistics.mean(log_widths)
+        features["max_log_width"] = max(log_widths)
+
+    seen = dict()
+    for text in dop.cost:
+        expr = parse_expression(text)
+        features["depth"] = max(features["depth"], depth(expr))
+        for node in walk(expr):
+            features["nodes"] += 1
+            if node[0] in OPERATOR_FEATURES:
+                features[OPERATOR_FEATURES[node[0]]] += 1
+            if children(node) != ():
+                seen[node] = seen.get(node, 0) + 1
+
+    features["repeated_subexpressions"] = sum(c-1 for c in seen.values())
+    return features
+
+
+def run_features(features, timeout, mode):
+    features = dict(features)
+    features["log_timeout"] = math.log1p(timeout)
+    features["min_mode"] = 1 if mode == "MIN" else 0
+    return features
+
+
+
+
+def solve(matrix, vector):
+    ''' Gaussian elimination with partial pivoting, inputs are copied '''
+    n = len(vector)
+    a = [list(row) + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        a[col], a[pivot] = a[pivot], a[col]
+        if a[col][col] == 0.0:
+            continue
+        for row in range(col+1, n):
+            factor = a[row][col] / a[col][col]
+            if factor != 0.0:
+                for k in range(col, n+1):
+                    a[row][k] -= factor * a[col][k]
+    x = [0.0] * n
+    for row in reversed(range(n)):
+        if a[row][row] == 0.0:
+            continue
+        acc = a[row][n] - sum(a[row][k] * x[k] for k in range(row+1, n))
+        x[row] = acc / a[row][row]
+    return x
+
+
+def sigmoid(z):
+    if z < -30:
+        return 0.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+
+
+class RuntimeModel():
+    '''
+    Ridge regression of log run time and ridge logistic regression of running
+    out of time (TIMEOUT or RAN_OUT), over standardized log1p features
+    '''
+    FEATURES = BENCHMARK_FEATURES + RUN_FEATURES
+
+    def __init__(self, ridge=1.0):
+        self.ridge = ridge
+        self.means = None
+        self.scales = None
+        self.time_weights = None
+        self.ran_out_weights = None
+
+    def transform(self, features):
+        row = [1.0]
+        for i, name in enumerate(self.FEATURES):
+            value = features[name]
+            value = math.copysign(math.log1p(abs(value)), value)
+            row.append((value - self.means[i]) / self.scales[i])
+        return row
+
+    def fit(self, samples):
+        '''
+        samples is a list of (features, elapsed, ran_out) tuples
+        '''
+        raw = [[math.copysign(math.log1p(abs(f[name])), f[name])
+                for name in self.FEATURES]
+               for f, elapsed, ran_out in samples]
+        self.means = [statistics.mean(col) for col in zip(*raw)]
+        self.scales = [statistics.pstdev(col) or 1.0 for col in zip(*raw)]
+        rows = [self.transform(f) for f, elapsed, ran_out in samples]
+        times = [math.log(max(elapsed, 1e-3)) for f, elapsed, ran_out in samples]
+        ran_outs = [1.0 if ran_out else 0.0 for f, elapsed, ran_out in samples]
+
+        self.time_weights = self.fit_linear(rows, times)
+        self.ran_out_weights = self.fit_logistic(rows, ran_outs)
+
+    def penalty(self, n):
+        # The intercept is not penalized
+        return [[self.ridge if i == j and i != 0 else 0.0 for j in range(n)]
+                for i in range(n)]
+
+    def fit_linear(self, rows, targets):
+        n = len(rows[0])
+        gram = self.penalty(n)
+        rhs = [0.0] * n
+        for row, target in zip(rows, targets):
+            for i in range(n):
+                rhs[i] += row[i] * target
+                for j in range(n):
+                    gram[i][j] += row[i] * row[j]
+        return solve(gram, rhs)
+
+    def fit_logistic(self, rows, targets, iterations=25):
+        n = len(rows[0])
+        weights = [0.0] * n
+        for _ in range(iterations):
+            hessian = self.penalty(n)
+            gradient = [self.ridge * w if i != 0 else 0.0
+                        for i, w in enumerate(weights)]
+            for row, target in zip(rows, targets):
+                p = sigmoid(sum(w*x for w, x in zip(weights, row)))
+                for i in range(n):
+                    gradient[i] += (p - target) * row[i]
+                    for j in range(n):
+                        hessian[i][j] += p * (1 - p) * row[i] * row[j]
+            step = solve(hessian, gradient)
+            weights = [w - s for w, s in zip(weights, step)]
+            if max(abs(s) for s in step) < 1e-8:
+                break
+        return weights
+
+    def predict(self, features):
+        '''
+        Returns the (expected elapsed seconds, probability of running out)
+        '''
+        row = self.transform(features)
+        log_time = sum(w*x for w, x in zip(self.time_weights, row))
+        ran_out = sigmoid(sum(w*x for w, x in zip(self.ran_out_weights, row)))
+        return math.exp(log_time), ran_out
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"features"        : self.FEATURES,
+                       "ridge"           : self.ridge,
+                       "means"           : self.means,
+                       "scales"          : self.scales,
+                       "time_weights"    : self.time_weights,
+                       "ran_out_weights" : self.ran_out_weights},
+                      f, indent=2)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "r") as f:
+            data = json.load(f)
+        if data["features"] != cls.FEATURES:
+            raise ValueError("Model '{}' was fit with different features, refit it".format(filename))
+        model = cls(data["ridge"])
+        model.means = data["means"]
+        model.scales = data["scales"]
+        model.time_weights = data["time_weights"]
+        model.ran_out_weights = data["ran_out_weights"]
+        return model
+
+
+
+
+class FeatureCache():
+    ''' Parses each benchmark at most once '''
+    def __init__(self):
+        self.features = dict()
+
+    def get(self, filename):
+        if filename not in self.features:
+            try:
+                self.features[filename] = extract_features(read_dop(filename))
+            except (OSError, ValueError) as e:
+                print("WARNING: no features for '{}': {}".format(filename, e),
+                      file=sys.stderr)
+                self.features[filename] = None
+        return self.features[filename]
+
+
+def predict_elapsed(model, cache, filename, timeout, mode):
+    features = cache.get(filename)
+    if features is None:
+        return None
+    elapsed, ran_out = model.predict(run_features(features, timeout, mode))
+    return elapsed
+
+
+def load_samples(regression_filenames, cache):
+    '''
+    Training samples from regression files, returned as a list of
+    (path, (features, elapsed, ran_out)) pairs
+    '''
+    samples = list()
+    for filename in regression_filenames:
+        regression = read_regressionfile(filename)
+        for benchmark, elapsed in regression.elapsed.items():
+            features = cache.get(benchmark)
+            if features is None or elapsed is None:
+                continue
+            ran_out = regression.timeout > 0 and elapsed > regression.timeout
+            features = run_features(features, regression.timeout,
+                                    regression.mode)
+            samples.append((benchmark, (features, elapsed, ran_out)))
+    return samples
+
+
+def cross_validate(samples, folds, ridge):
+    '''
+    Grouped k-fold cross validation, all runs of one benchmark share a fold.
+    Returns (predicted elapsed, predicted probability, sample) triples.
+    '''
+    def fold_of(benchmark):
+        return int(hashlib.sha1(benchmark.encode()).hexdigest(), 16) % folds
+
+    results = list()
+    for fold in range(folds):
+        train = [s for b, s in samples if fold_of(b) != fold]
+        test = [s for b, s in samples if fold_of(b) == fold]
+        if train == [] or test == []:
+            continue
+        model = RuntimeModel(ridge)
+        model.fit(train)
+        for sample in test:
+            elapsed, ran_out = model.predict(sample[0])
+            results.append((elapsed, ran_out, sample))
+    return results
+
+
+def print_accuracy(results):
+    if results == []:
+        print("too few benchmarks to cross validate")
+        return
+    log_errors = [abs(math.log10(max(elapsed, 1e-3) / max(s[1], 1e-3)))
+                  for elapsed, ran_out, s in results]
+    baseline = math.exp(statistics.mean(math.log(max(s[1], 1e-3))
+                                        for e, r, s in results))
+    baseline_errors = [abs(math.log10(baseline / max(s[1], 1e-3)))
+                       for e, r, s in results]
+    correct = sum(1 for e, ran_out, s in results if (ran_out >= 0.5) == s[2])
+    majority = sum(1 for e, r, s in results if s[2])
+    majority = max(majority, len(results) - majority)
+    brier = statistics.mean((ran_out - (1.0 if s[2] else 0.0))**2
+                            for e, ran_out, s in results)
+    total = len(results)
+
+    print("samples: {}".format(total))
+    print("elapsed median factor: {:.2f} (baseline {:.2f})".format(
+        10**statistics.median(log_errors), 10**statistics.median(baseline_errors)))
+    print("elapsed within 2x: {:.1%}".format(
+        sum(1 for e in log_errors if e <= math.log10(2)) / total))
+    print("elapsed within 10x: {:.1%}".format(
+        sum(1 for e in log_errors if e <= 1) / total))
+    print("ran out accuracy: {:.1%} (majority class {:.1%})".format(
+        correct / total, majority / total))
+    print("ran out brier score: {:.3f}".format(brier))
+
+
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show",
+                                 help="Print the static features of benchmarks")
+    show.add_argument("benchmarks", nargs="+")
+
+    fit = subparsers.add_parser("fit",
+                                help="Fit a runtime model to regression files and report its cross validated accuracy")
+    fit.add_argument("-o",
+                     help="Where to write the fitted model",
+                     type=str,
+                     required=True)
+    fit.add_argument("--folds",
+                     help="Number of cross validation folds",
+                     type=int,
+                     default=5)
+    fit.add_argument("--ridge",
+                     help="Regularization strength",
+                     type=float,
+                     default=1.0)
+    fit.add_argument("regression_files", nargs="+")
+
+    predict = subparsers.add_parser("predict",
+                                    help="Predict run time of benchmarks")
+    predict.add_argument("model")
+    predict.add_argument("--timeout",
+                         type=int,
+                         default=60)
+    predict.add_argument("--min",
+                         action='store_const',
+                         const=True,
+                         default=False)
+    predict.add_argument("benchmarks", nargs="+")
+
+    args = parser.parse_args(args=argv[1:])
+    if args.command == "fit" and args.folds < 2:
+        parser.error("--folds must be at least 2")
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    cache = FeatureCache()
+
+    if args.command == "show":
+        print("\t".join(["Benchmark"] + BENCHMARK_FEATURES))
+        for filename in args.benchmarks:
+            features = cache.get(filename)
+            if features is not None:
+                print("\t".join([filename] + ["{:.4g}".format(features[k])
+                                              for k in BENCHMARK_FEATURES]))
+
+    elif args.command == "fit":
+        samples = load_samples(args.regression_files, cache)
+        if samples == []:
+            print("No usable samples in the given regression files")
+            return 1
+        print_accuracy(cross_validate(samples, args.folds, args.ridge))
+        model = RuntimeModel(args.ridge)
+        model.fit([s for b, s in samples])
+        model.save(args.o)
+
+    else:
+        model = RuntimeModel.load(args.model)
+        mode = "MIN" if args.min else "MAX"
+        print("\t".join(["Benchmark", "PredictedElapsed", "RanOutProbability"]))
+        for filename in args.benchmarks:
+            features = cache.get(filename)
+            if features is None:
+                continue
+            elapsed, ran_out = model.predict(run_features(features,
+                                                          args.timeout, mode))
+            print("{}\t{:.3f}\t{:.3f}".format(filename, elapsed, ran_out))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
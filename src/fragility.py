@@ -0,0 +1,84 @@
+from dop_file import read_dop
+from regression_file import read_regressionfile
+from test import Test
+from tool_adapter import GelpiaAdapter
+
+
+
+
+# Verdicts that make a benchmark fragile. A regression file cannot tell a
+# crash from a run without output, so both count as CRASH.
+FRAGILE_STATES = [
+    "CRASH",
+    "TIMEOUT",
+    "BROKEN",
+    "FAR_WORSE",
+]
+
+
+
+
+def replay(regression, filename, expected, previous_range):
+    '''
+    Scores one regression file row as if it had just been run. Rows without
+    a time, written for tests the tool could not run, stay NOT_RAN.
+    '''
+    test = Test(GelpiaAdapter(), filename, regression.mode,
+                regression.abs_tol, regression.rel_tol, regression.timeout,
+                expected)
+    if regression.elapsed[filename] is None:
+        test.answer_range = (None, None)
+        return test
+    test.execution.elapsed = regression.elapsed[filename]
+    test.execution.retcode = 0
+    if previous_range is not None:
+        test.set_regression(previous_range)
+    test.score(regression.ranges[filename])
+    return test
+
+
+def past_verdicts(regression_filenames):
+    '''
+    Counts the fragile verdicts of every benchmark in the given regression
+    files, which are taken to be in chronological order. FAR_WORSE is judged
+    against the previous file with the same mode and flags.
+
+    Returns a dict mapping benchmark paths to {state: count} dicts.
+    '''
+    verdicts = dict()
+    previous = dict()
+    expected = dict()
+    for regression_filename in regression_filenames:
+        regression = read_regressionfile(regression_filename)
+        key = (regression.mode, regression.flags)
+        last_ranges = previous.get(key, dict())
+        for filename in regression.ranges:
+            if (filename, regression.mode) not in expected:
+                try:
+                    dop = read_dop(filename)
+                except (OSError, ValueError):
+                    # The benchmark has since been removed or broken
+                    continue
+                for mode in ["MIN", "MAX"]:
+                    expected[(filename, mode)] = dop.expected_value(mode)
+
+            test = replay(regression, filename,
+                          expected[(filename, regression.mode)],
+                          last_ranges.get(filename))
+            counts = verdicts.setdefault(filename,
+                                         {k:0 for k in FRAGILE_STATES})
+            if test.main_state in {"CRASH", "FAILED"}:
+                counts["CRASH"] += 1
+            if test.main_state == "TIMEOUT":
+                counts["TIMEOUT"] += 1
+            if test.strict_state == "BROKEN":
+                counts["BROKEN"] += 1
+            if test.regression_state == "FAR_WORSE":
+                counts["FAR_WORSE"] += 1
+        previous[key] = regression.ranges
+    return verdicts
+
+
+def fragility_scores(regression_filenames):
+    return {filename : sum(counts.values())
+            for filename, counts in past_verdicts(regression_filenames).items()}
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+
+
+from dop_file import expected_header
+
+import abc
+import argparse
+import math
+import os
+import os.path as path
+import sys
+
+
+
+
+PI_VARIABLE = "[3.141592653589793115997963468544185161590576171875, 3.141592653589793560087173318606801331043243408203125] pi;"
+
+
+
+
+def number(value):
+    ''' Formats a number the way the hand written benchmarks do '''
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def extreme_1d(f, low, high, maximize, samples=20001):
+    '''
+    Numerically finds the extreme of a one dimensional function on
+    [low, high] by dense sampling followed by golden section refinement.
+    Returns (x, f(x)).
+    '''
+    sign = -1.0 if maximize else 1.0
+    step = (high - low) / (samples - 1)
+    xs = [low + i*step for i in range(samples)]
+    best = min(range(samples), key=lambda i: sign*f(xs[i]))
+
+    a = xs[max(best-1, 0)]
+    b = xs[min(best+1, samples-1)]
+    ratio = (math.sqrt(5) - 1) / 2
+    c = b - ratio*(b - a)
+    d = a + ratio*(b - a)
+    for _ in range(100):
+        if sign*f(c) < sign*f(d):
+            b = d
+        else:
+            a = c
+        c = b - ratio*(b - a)
+        d = a + ratio*(b - a)
+
+    candidates = [xs[best], (a + b) / 2]
+    x = min(candidates, key=lambda x: sign*f(x))
+    return x, f(x)
+
+
+
+
+class Family(abc.ABC):
+    '''
+    A scalable benchmark function, in the same form as the hand written
+    versions in classical_tests.
+
+    optima returns a dict mapping "MIN"/"MAX" to (value, type, inputs) for
+    every optimum that is known for the given dimension and box.
+    '''
+    NAME = None
+    MIN_DIMENSION = 1
+    EXTRA_VARIABLES = []
+
+    @abc.abstractmethod
+    def default_box(self, dimension):
+        pass
+
+    @abc.abstractmethod
+    def cost(self, dimension):
+        pass
+
+    @abc.abstractmethod
+    def optima(self, dimension, low, high):
+        pass
+
+
+class Ackley(Family):
+    # Negated and shifted to 5, so the maximum is known
+    NAME = "ackley"
+    EXTRA_VARIABLES = [PI_VARIABLE]
+
+    def default_box(self, dimension):
+        return (-32.768, 32.768)
+
+    def cost(self, dimension):
+        squares = " + ".join("(x{} - 5)^2".format(i)
+                             for i in range(1, dimension+1))
+        cosines = " + ".join("cos(2*pi*(x{} - 5))".format(i)
+                             for i in range(1, dimension+1))
+        if dimension == 1:
+            return ["20 * exp(-0.2 * sqrt({}))".format(squares),
+                    "exp({})".format(cosines)]
+        return ["20 * exp(-0.2 * sqrt(({}) / {}))".format(squares, dimension),
+                "exp(({}) / {})".format(cosines, dimension)]
+
+    def optima(self, dimension, low, high):
+        if not low <= 5 <= high:
+            return dict()
+        return {"MAX" : (20 + math.e, "analytic", [5.0]*dimension)}
+
+
+class DixonPrice(Family):
+    NAME = "dixon_price"
+
+    def default_box(self, dimension):
+        return (-10.0, 10.0)
+
+    def cost(self, dimension):
+        lines = ["1 * (x1 - 1)^2"]
+        for i in range(2, dimension+1):
+            lines.append("{} * (2 * x{}^2 - x{})^2".format(i, i, i-1))
+        return lines
+
+    def optima(self, dimension, low, high):
+        optima = dict()
+        argmin = [2**(-(2**i - 2) / 2**i) for i in range(1, dimension+1)]
+        if all(low <= x <= high for x in argmin):
+            optima["MIN"] = (0.0, "analytic", argmin)
+        # Every term is largest with all variables at low
+        if low <= 0 and -low >= high:
+            value = (low - 1)**2 + sum(i * (2*low**2 - low)**2
+                                       for i in range(2, dimension+1))
+            optima["MAX"] = (value, "analytic", [low]*dimension)
+        return optima
+
+
+class GriewankShifted(Family):
+    # Negated and shifted to 1.1, so the maximum is known
+    NAME = "griewank_shifted"
+
+    def default_box(self, dimension):
+        return (-600.0, 600.0)
+
+    def cost(self, dimension):
+        squares = " + ".join("(x{} - 1.1)^2 / 4000".format(i)
+                             for i in range(1, dimension+1))
+        cosines = " * ".join("cos((x{} - 1.1) / sqrt({}))".format(i, i)
+                             for i in range(1, dimension+1))
+        return ["-({})".format(squares), cosines]
+
+    def optima(self, dimension, low, high):
+        if not low <= 1.1 <= high:
+            return dict()
+        return {"MAX" : (1.0, "analytic", [1.1]*dimension)}
+
+
+class Rosenbrock(Family):
+    NAME = "rosenbrock"
+    MIN_DIMENSION = 2
+
+    def default_box(self, dimension):
+        return (-5.0, 10.0)
+
+    def cost(self, dimension):
+        return ["100 * (x{} - x{}^2)^2 + (x{} - 1)^2".format(i+1, i, i)
+                for i in range(1, dimension)]
+
+    def optima(self, dimension, low, high):
+        # The maximum over a box is not known in closed form
+        if not low <= 1 <= high:
+            return dict()
+        return {"MIN" : (0.0, "analytic", [1.0]*dimension)}
+
+
+class Trid(Family):
+    # Negated, so the maximum is known
+    NAME = "trid"
+
+    def default_box(self, dimension):
+        return (-100.0, 100.0)
+
+    def cost(self, dimension):
+        lines = ["0 - (x1 - 1)^2"]
+        for i in range(2, dimension+1):
+            lines.append("x{} * x{} - (x{} - 1)^2".format(i, i-1, i))
+        return lines
+
+    def optima(self, dimension, low, high):
+        argmax = [float(i * (dimension + 1 - i)) for i in range(1, dimension+1)]
+        if not all(low <= x <= high for x in argmax):
+            return dict()
+        value = dimension * (dimension + 4) * (dimension - 1) / 6
+        return {"MAX" : (value, "analytic", argmax)}
+
+
+class Separable(Family):
+    '''
+    Families which are a sum of one dimensional terms, their optima are the
+    sums of numerically found per variable optima
+    '''
+    @abc.abstractmethod
+    def term(self, i):
+        pass
+
+    def optima(self, dimension, low, high):
+        optima = dict()
+        for mode in ["MIN", "MAX"]:
+            inputs = list()
+            value = 0.0
+            for i in range(1, dimension+1):
+                x, fx = extreme_1d(self.term(i), low, high, mode == "MAX")
+                inputs.append(x)
+                value += fx
+            optima[mode] = (value, "provisional", inputs)
+        return optima
+
+
+class Schwefel(Separable):
+    NAME = "schwefel"
+
+    def default_box(self, dimension):
+        return (-500.0, 500.0)
+
+    def cost(self, dimension):
+        return ["x{} * sin(sqrt(abs(x{})))".format(i, i)
+                for i in range(1, dimension+1)]
+
+    def term(self, i):
+        return lambda x: x * math.sin(math.sqrt(abs(x)))
+
+
+class Michalewicz(Separable):
+    NAME = "michalewicz"
+    EXTRA_VARIABLES = [PI_VARIABLE]
+
+    def default_box(self, dimension):
+        return (0.0, 3.1415927)
+
+    def cost(self, dimension):
+        return ["sin(x{}) * sin({} * x{}^2 / pi)^20".format(i, i, i)
+                for i in range(1, dimension+1)]
+
+    def term(self, i):
+        return lambda x: math.sin(x) * math.sin(i * x**2 / math.pi)**20
+
+
+FAMILIES = {f.NAME : f for f in [Ackley(), DixonPrice(), GriewankShifted(),
+                                  Rosenbrock(), Trid(), Schwefel(),
+                                  Michalewicz()]}
+
+
+
+
+def generate(family, dimension, width=None):
+    '''
+    Returns the text of a .dop file for the family at the given dimension.
+    width overrides the width of the box, which stays centered where the
+    family's default box is.
+    '''
+    low, high = family.default_box(dimension)
+    if width is not None:
+        center = (low + high) / 2
+        low, high = center - width/2, center + width/2
+
+    lines = list()
+    optima = family.optima(dimension, low, high)
+    for mode in ["MIN", "MAX"]:
+        if mode not in optima:
+            continue
+        value, kind, inputs = optima[mode]
+        names = ["x{}".format(i) for i in range(1, dimension+1)]
+        lines.extend(expected_header(mode, value, kind, zip(names, inputs)))
+        lines.append("")
+
+    lines.append("var:")
+    for i in range(1, dimension+1):
+        lines.append("[{}, {}] x{};".format(number(low), number(high), i))
+    lines.extend(family.EXTRA_VARIABLES)
+    lines.append("")
+    lines.append("cost:")
+    lines.extend(c + ";" for c in family.cost(dimension))
+    lines.append("")
+    return "\n".join(lines)
+
+
+def parse_dimensions(text):
+    ''' Parses dimension lists such as "2-20" or "2,4,8,16" '''
+    dimensions = list()
+    for part in text.split(","):
+        first, sep, last = part.partition("-")
+        if sep == "":
+            dimensions.append(int(first))
+        else:
+            dimensions.extend(range(int(first), int(last)+1))
+    if any(d < 1 for d in dimensions):
+        raise ValueError("Dimensions must be positive")
+    return dimensions
+
+
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Generate scalable benchmark families with known optima")
+    parser.add_argument("--family",
+                        help="Family to generate, may be repeated, default is all of: {}".format(", ".join(sorted(FAMILIES))),
+                        type=str,
+                        choices=sorted(FAMILIES),
+                        action="append")
+    parser.add_argument("--dims",
+                        help="Dimensions to generate, e.g. '2-20' or '2,4,8,16'",
+                        type=str,
+                        default="1-10")
+    parser.add_argument("--width",
+                        help="Box width, defaults to each family's usual box",
+                        type=float)
+    parser.add_argument("-o",
+                        help="Output directory, files are written to a sub directory per family, or per family and width with --width",
+                        type=str,
+                        required=True)
+
+    args = parser.parse_args(args=argv[1:])
+    try:
+        args.dims = parse_dimensions(args.dims)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.family is None:
+        args.family = sorted(FAMILIES)
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+
+    count = 0
+    for name in args.family:
+        family = FAMILIES[name]
+        # Each directory is one series for scaling_report, so other box
+        # widths get their own
+        directory = path.join(args.o, name)
+        if args.width is not None:
+            directory = path.join(args.o, "{}_w{}".format(name,
+                                                          number(args.width)))
+        os.makedirs(directory, exist_ok=True)
+        for dimension in args.dims:
+            if dimension < family.MIN_DIMENSION:
+                continue
+            filename = "{}_{:02d}.dop".format(name, dimension)
+            if args.width is not None:
+                filename = "{}_{:02d}_w{}.dop".format(name, dimension,
+                                                     number(args.width))
+            with open(path.join(directory, filename), "w") as f:
+                f.write(generate(family, dimension, args.width))
+            count += 1
+
+    print("Wrote {} benchmarks to '{}'".format(count, args.o))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
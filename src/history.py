@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+
+
+from color_printing import *
+from dop_file import read_dop
+from fragility import replay
+from regression_file import read_regressionfile, write_regressionfile
+
+import argparse
+import hashlib
+import math
+import os
+import os.path as path
+import shutil
+import socket
+import sqlite3
+import statistics
+import sys
+import time
+
+
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id       INTEGER PRIMARY KEY,
+    time     REAL,
+    tool     TEXT,
+    exe      TEXT,
+    exe_hash TEXT,
+    flags    TEXT,
+    host     TEXT,
+    mode     TEXT,
+    timeout  INTEGER,
+    abs_tol  REAL,
+    rel_tol  REAL,
+    source   TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    path             TEXT,
+    run_id           INTEGER,
+    low              REAL,
+    high             REAL,
+    elapsed          REAL,
+    max_rss          INTEGER,
+    main_state       TEXT,
+    strict_state     TEXT,
+    width_state      TEXT,
+    regression_state TEXT,
+    PRIMARY KEY (path, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+
+
+
+def executable_hash(exe):
+    '''
+    sha1 of the executable a command name resolves to, None if it cannot be
+    found or read
+    '''
+    resolved = shutil.which(exe)
+    if resolved is None:
+        return None
+    digest = hashlib.sha1()
+    try:
+        with open(resolved, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def family_of(filename):
+    return path.basename(path.dirname(filename))
+
+
+
+
+class Run():
+    def __init__(self, row):
+        (self.id, self.time, self.tool, self.exe, self.exe_hash, self.flags,
+         self.host, self.mode, self.timeout, self.abs_tol, self.rel_tol,
+         self.source) = row
+
+
+class Result():
+    ''' One benchmark's stored outcome, writable as a regression file row '''
+    def __init__(self, row):
+        (self.path, self.run_id, self.low, self.high, self.elapsed,
+         self.max_rss, self.main_state, self.strict_state, self.width_state,
+         self.regression_state) = row
+
+    def regression_row(self):
+        return "\t".join(str(t) for t in [self.path,
+                                          self.low,
+                                          self.high,
+                                          self.elapsed])
+
+
+
+
+class History():
+    '''
+    Append only store of every tester run: the run settings together with
+    each benchmark's bounds, states, time and peak memory.
+
+    Results are keyed by benchmark path first so that the history of one
+    benchmark is a single index range.
+    '''
+    RUN_COLUMNS = ("time, tool, exe, exe_hash, flags, host, mode, timeout, "
+                   "abs_tol, rel_tol, source")
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, tool, exe, flags, mode, timeout, abs_tol, rel_tol,
+                results, when=None, source=None, host=None):
+        '''
+        Appends one run, results is a list of (path, low, high, elapsed,
+        max_rss, main_state, strict_state, width_state, regression_state)
+        tuples. host is None when the machine the run was made on is not
+        known. Returns the new run id.
+        '''
+        exe_hash = None if exe is None else executable_hash(exe)
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO runs ({}) VALUES (?,?,?,?,?,?,?,?,?,?,?)"
+                       .format(self.RUN_COLUMNS),
+                       (when if when is not None else time.time(),
+                        tool, exe, exe_hash, flags, host,
+                        mode, timeout, abs_tol, rel_tol, source))
+        run_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO results VALUES (?,?,?,?,?,?,?,?,?,?)",
+                           [(r[0], run_id) + tuple(r[1:]) for r in results])
+        self.connection.commit()
+        return run_id
+
+    def add_tests(self, adapter, mode, timeout, abs_tol, rel_tol, tests):
+        ''' Appends the tests of one tester run that used adapter '''
+        results = list()
+        for t in tests:
+            if t.adapter is not adapter or t.answer_range is None:
+                continue
+            results.append((t.path,
+                            t.answer_range[0],
+                            t.answer_range[1],
+                            t.execution.elapsed,
+                            t.execution.max_rss,
+                            t.main_state,
+                            t.strict_state,
+                            t.width_state,
+                            t.regression_state))
+        return self.add_run(adapter.NAME, adapter.exe, adapter.flags, mode,
+                            timeout, abs_tol, rel_tol, results,
+                            source="tester", host=socket.gethostname())
+
+    def import_regressionfile(self, filename, tool="gelpia"):
+        '''
+        Appends a regression file as a run dated by its modification time.
+        States are recomputed from the benchmark headers and the previous
+        stored run with the same tool, mode and flags.
+        '''
+        regression = read_regressionfile(filename)
+        previous = self.latest_run(tool, regression.mode, regression.flags)
+        previous_ranges = dict()
+        if previous is not None:
+            previous_ranges = {r.path : (r.low, r.high)
+                               for r in self.results(previous.id)}
+
+        results = list()
+        for benchmark, answer_range in regression.ranges.items():
+            try:
+                expected = read_dop(benchmark).expected_value(regression.mode)
+            except (OSError, ValueError):
+                expected = None
+            test = replay(regression, benchmark, expected,
+                          previous_ranges.get(benchmark))
+            results.append((benchmark,
+                            answer_range[0],
+                            answer_range[1],
+                            regression.elapsed[benchmark],
+                            None,
+                            test.main_state,
+                            test.strict_state,
+                            test.width_state,
+                            test.regression_state))
+        return self.add_run(tool, None, regression.flags, regression.mode,
+                            regression.timeout, regression.abs_tol,
+                            regression.rel_tol, results,
+                            when=os.stat(filename).st_mtime,
+                            source=path.abspath(filename))
+
+    def runs(self, last=None, tool=None, mode=None, flags=None, timeout=None):
+        ''' Matching runs, oldest first '''
+        clauses = list()
+        params = list()
+        for column, value in [("tool", tool), ("mode", mode), ("flags", flags),
+                              ("timeout", timeout)]:
+            if value is not None:
+                clauses.append("{} = ?".format(column))
+                params.append(value)
+        query = "SELECT id, {} FROM runs".format(self.RUN_COLUMNS)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id DESC"
+        if last is not None:
+            query += " LIMIT ?"
+            params.append(last)
+        rows = self.connection.execute(query, params).fetchall()
+        return [Run(row) for row in reversed(rows)]
+
+    def run(self, run_id):
+        row = self.connection.execute(
+            "SELECT id, {} FROM runs WHERE id = ?".format(self.RUN_COLUMNS),
+            (run_id,)).fetchone()
+        return None if row is None else Run(row)
+
+    def latest_run(self, tool=None, mode=None, flags=None):
+        runs = self.runs(last=1, tool=tool, mode=mode, flags=flags)
+        return runs[0] if runs else None
+
+    def results(self, run_id):
+        return [Result(row) for row in self.connection.execute(
+            "SELECT * FROM results WHERE run_id = ? ORDER BY path", (run_id,))]
+
+    def series(self, filename, last=200, mode=None):
+        '''
+        (run, result) pairs for one benchmark over its last runs, oldest first
+        '''
+        query = ("SELECT r.id, r.{}, s.* FROM results s "
+                 "JOIN runs r ON r.id = s.run_id WHERE s.path = ?"
+                 .format(self.RUN_COLUMNS.replace(", ", ", r.")))
+        params = [filename]
+        if mode is not None:
+            query += " AND r.mode = ?"
+            params.append(mode)
+        query += " ORDER BY s.run_id DESC LIMIT ?"
+        params.append(last)
+        rows = self.connection.execute(query, params).fetchall()
+        return [(Run(row[:12]), Result(row[12:])) for row in reversed(rows)]
+
+    def drift(self, runs):
+        '''
+        Per family trend of elapsed time across the given runs, oldest first.
+
+        Each benchmark's times are normalized by its median over the runs so
+        that families are not dominated by their slowest member. A family's
+        level in a run is the geometric mean of its normalized times, and its
+        drift is the least squares slope of the log level against run index.
+
+        Returns {family: (runs seen, fractional change per run)}.
+        '''
+        times = dict()
+        for index, run in enumerate(runs):
+            for r in self.results(run.id):
+                if r.main_state != "RAN" or r.elapsed is None:
+                    continue
+                times.setdefault(r.path, list()).append(
+                    (index, max(r.elapsed, 1e-3)))
+
+        levels = dict()
+        for filename, samples in times.items():
+            median = statistics.median(e for i, e in samples)
+            family = levels.setdefault(family_of(filename), dict())
+            for index, elapsed in samples:
+                family.setdefault(index, list()).append(
+                    math.log(elapsed / median))
+
+        drifts = dict()
+        for family, by_run in levels.items():
+            if len(by_run) < 2:
+                continue
+            xs = sorted(by_run)
+            ys = [statistics.mean(by_run[x]) for x in xs]
+            mean_x = statistics.mean(xs)
+            mean_y = statistics.mean(ys)
+            slope = (sum((x - mean_x)*(y - mean_y) for x, y in zip(xs, ys))
+                     / sum((x - mean_x)**2 for x in xs))
+            drifts[family] = (len(xs), math.exp(slope) - 1)
+        return drifts
+
+    def export(self, run_id, filename):
+        ''' Writes a stored run back out as a regression file '''
+        run = self.run(run_id)
+        if run is None:
+            raise ValueError("No run with id {}".format(run_id))
+        write_regressionfile(filename, run.flags, run.timeout, run.mode,
+                             run.abs_tol, run.rel_tol, self.results(run_id))
+
+
+
+
+def format_time(when):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(when))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Query the history of tester runs")
+    parser.add_argument("history",
+                        help="History database file, created if missing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add = subparsers.add_parser("import",
+                                help="Append regression files as runs, oldest first")
+    add.add_argument("--tool",
+                     help="Tool the regression files were made with",
+                     type=str,
+                     default="gelpia")
+    add.add_argument("regression_files", nargs="+")
+
+    runs = subparsers.add_parser("runs",
+                                 help="List stored runs")
+    runs.add_argument("--last",
+                      help="Only list this many of the latest runs",
+                      type=int)
+
+    series = subparsers.add_parser("series",
+                                   help="Show one benchmark's results over time")
+    series.add_argument("--last",
+                        help="Number of latest runs to show",
+                        type=int,
+                        default=200)
+    series.add_argument("--mode",
+                        help="Only show runs in this mode",
+                        choices=["MIN", "MAX"])
+    series.add_argument("benchmark")
+
+    drift = subparsers.add_parser("drift",
+                                  help="Show the elapsed time trend of each family")
+    drift.add_argument("--last",
+                       help="Number of latest runs to consider",
+                       type=int,
+                       default=30)
+    drift.add_argument("--tool", type=str, default="gelpia")
+    drift.add_argument("--mode", choices=["MIN", "MAX"], default="MAX")
+    drift.add_argument("--flags",
+                       help="Only consider runs with exactly these flags, default is the flags of the latest run",
+                       type=str)
+    drift.add_argument("--timeout",
+                       help="Only consider runs with this timeout, default is the timeout of the latest run",
+                       type=int)
+    drift.add_argument("--threshold",
+                       help="Highlight families whose time grows by more than this fraction over the runs",
+                       type=float,
+                       default=0.1)
+
+    export = subparsers.add_parser("export",
+                                   help="Write a stored run as a regression file")
+    export.add_argument("run_id", type=int)
+    export.add_argument("-o",
+                        help="Regression file to write",
+                        type=str,
+                        required=True)
+
+    return parser.parse_args(args=argv[1:])
+
+
+def main(argv):
+    args = parse_args(argv)
+    history = History(args.history)
+    retval = 0
+
+    if args.command == "import":
+        for filename in args.regression_files:
+            run_id = history.import_regressionfile(filename, args.tool)
+            print("{}\t{}".format(run_id, filename))
+
+    elif args.command == "runs":
+        print("\t".join(["Run", "Time", "Tool", "Host", "Mode", "Timeout",
+                         "ExeHash", "Flags"]))
+        for run in history.runs(last=args.last):
+            print("\t".join(str(t) for t in [
+                run.id, format_time(run.time), run.tool, run.host, run.mode,
+                run.timeout, (run.exe_hash or "None")[:12], run.flags]))
+
+    elif args.command == "series":
+        print("\t".join(["Run", "Time", "Tool", "Mode", "AnswerLow",
+                         "AnswerHigh", "Elapsed", "MaxRSS", "MainState",
+                         "StrictState"]))
+        for run, r in history.series(args.benchmark, args.last, args.mode):
+            print("\t".join(str(t) for t in [
+                run.id, format_time(run.time), run.tool, run.mode, r.low,
+                r.high, r.elapsed, r.max_rss, r.main_state, r.strict_state]))
+
+    elif args.command == "drift":
+        # Runs with other flags or timeouts would show up as drift
+        flags = args.flags
+        timeout = args.timeout
+        latest = history.latest_run(args.tool, args.mode, flags)
+        if latest is not None:
+            flags = latest.flags if flags is None else flags
+            timeout = latest.timeout if timeout is None else timeout
+        runs = history.runs(last=args.last, tool=args.tool, mode=args.mode,
+                            flags=flags, timeout=timeout)
+        drifts = history.drift(runs)
+        print("flags: {}".format(flags))
+        print("timeout: {}".format(timeout))
+        print("{} runs from {} to {}".format(
+            len(runs),
+            format_time(runs[0].time) if runs else "-",
+            format_time(runs[-1].time) if runs else "-"))
+        print("\t".join(["Family", "Runs", "PerRun", "Total"]))
+        for family, (count, per_run) in sorted(drifts.items(),
+                                               key=lambda p: -p[1][1]):
+            total = (1 + per_run)**(count - 1) - 1
+            text = "\t".join([family, str(count),
+                              "{:+.2%}".format(per_run),
+                              "{:+.1%}".format(total)])
+            if total > args.threshold:
+                text = red(text)
+            print(text)
+
+    else:
+        try:
+            history.export(args.run_id, args.o)
+        except ValueError as e:
+            print(str(e))
+            retval = 1
+
+    history.close()
+    return retval
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+'''
+A small stand-in for gelpia, for exercising the tester without the real
+tool. It bounds the cost over the box by interval branch and bound, without
+outward rounding, and answers in gelpia's format. Constraints only decide
+which sampled points may give the inner bound.
+'''
+
+
+from batch import begin_marker, end_marker
+from dop_expression import parse_constraint, parse_expression
+from dop_file import read_dop
+
+import argparse
+import heapq
+import math
+import sys
+import time
+
+
+
+
+INF = float("inf")
+
+EVERYTHING = (-INF, INF)
+
+
+def i_mul(a, b):
+    products = [x*y for x in a for y in b if not math.isnan(x*y)]
+    if products == []:
+        return EVERYTHING
+    return (min(products), max(products))
+
+
+def i_div(a, b):
+    if b[0] <= 0 <= b[1]:
+        return EVERYTHING
+    return i_mul(a, (1/b[1], 1/b[0]))
+
+
+def i_pow(a, b):
+    if b[0] != b[1]:
+        if a[0] <= 0:
+            return EVERYTHING
+        return i_exp(i_mul(b, i_log(a)))
+    n = b[0]
+    if n != int(n):
+        if a[0] < 0:
+            return EVERYTHING
+        return tuple(sorted([a[0]**n, a[1]**n]))
+    n = int(n)
+    if n < 0:
+        return i_div((1.0, 1.0), i_pow(a, (-n, -n)))
+    try:
+        values = [a[0]**n, a[1]**n]
+    except OverflowError:
+        return EVERYTHING
+    if n % 2 == 0 and a[0] <= 0 <= a[1]:
+        return (0.0, max(values))
+    return (min(values), max(values))
+
+
+def monotonic(f, low_limit=-INF):
+    def apply(a):
+        if a[0] < low_limit:
+            return EVERYTHING
+        try:
+            return (f(a[0]), f(a[1]))
+        except OverflowError:
+            return EVERYTHING
+    return apply
+
+
+i_exp = monotonic(math.exp)
+
+i_log = monotonic(lambda x: math.log(x) if x > 0 else -INF, 0.0)
+
+i_sqrt = monotonic(math.sqrt, 0.0)
+
+i_atan = monotonic(math.atan)
+
+
+def i_abs(a):
+    if a[0] >= 0:
+        return a
+    if a[1] <= 0:
+        return (-a[1], -a[0])
+    return (0.0, max(-a[0], a[1]))
+
+
+def i_sin(a):
+    if a[1] - a[0] >= 2*math.pi or math.isinf(a[1] - a[0]):
+        return (-1.0, 1.0)
+    low = min(math.sin(a[0]), math.sin(a[1]))
+    high = max(math.sin(a[0]), math.sin(a[1]))
+    # Peaks at pi/2 + 2k*pi and troughs at -pi/2 + 2k*pi
+    if math.ceil((a[0] - math.pi/2) / (2*math.pi)) <= (a[1] - math.pi/2) / (2*math.pi):
+        high = 1.0
+    if math.ceil((a[0] + math.pi/2) / (2*math.pi)) <= (a[1] + math.pi/2) / (2*math.pi):
+        low = -1.0
+    return (low, high)
+
+
+def i_cos(a):
+    return i_sin((a[0] + math.pi/2, a[1] + math.pi/2))
+
+
+def i_tan(a):
+    if a[1] - a[0] >= math.pi:
+        return EVERYTHING
+    if math.ceil((a[0] - math.pi/2) / math.pi) <= (a[1] - math.pi/2) / math.pi:
+        return EVERYTHING
+    return (math.tan(a[0]), math.tan(a[1]))
+
+
+FUNCTIONS = {
+    "abs"  : i_abs,
+    "atan" : i_atan,
+    "cos"  : i_cos,
+    "exp"  : i_exp,
+    "log"  : i_log,
+    "pow"  : i_pow,
+    "sin"  : i_sin,
+    "sqrt" : i_sqrt,
+    "tan"  : i_tan,
+}
+
+
+def evaluate(expr, box):
+    ''' Interval enclosure of an expression, box maps names to intervals '''
+    op = expr[0]
+    if op == "const":
+        return (expr[1], expr[1])
+    if op == "interval":
+        return (expr[1], expr[2])
+    if op == "var":
+        if expr[1] not in box and expr[1] == "pi":
+            return (math.pi, math.pi)
+        return box[expr[1]]
+    if op == "neg":
+        a = evaluate(expr[1], box)
+        return (-a[1], -a[0])
+    args = [evaluate(e, box) for e in expr[1:]]
+    if op == "+":
+        result = (args[0][0] + args[1][0], args[0][1] + args[1][1])
+    elif op == "-":
+        result = (args[0][0] - args[1][1], args[0][1] - args[1][0])
+    elif op == "*":
+        result = i_mul(*args)
+    elif op == "/":
+        result = i_div(*args)
+    elif op == "^":
+        result = i_pow(*args)
+    else:
+        result = FUNCTIONS[op](*args)
+    if any(math.isnan(x) for x in result):
+        return EVERYTHING
+    return result
+
+
+def satisfied(expr, point):
+    ''' Whether a constraint holds at a point given as degenerate intervals '''
+    op = expr[0]
+    if op == "&&":
+        return satisfied(expr[1], point) and satisfied(expr[2], point)
+    if op == "||":
+        return satisfied(expr[1], point) or satisfied(expr[2], point)
+    a = evaluate(expr[1], point)[0]
+    b = evaluate(expr[2], point)[0]
+    return {"<"  : a < b,
+            "<=" : a <= b,
+            ">"  : a > b,
+            ">=" : a >= b,
+            "="  : abs(a - b) <= 1e-9*(1 + abs(b))}[op]
+
+
+
+
+def maximize(dop, cost, timeout, max_iters):
+    '''
+    Returns (inner, outer) bounds on the maximum of cost, a list of parsed
+    terms, over the benchmark's box. inner is None when no feasible point
+    was seen.
+    '''
+    constraints = [parse_constraint(c) for c in dop.constraints]
+    names = [name for name, low, high in dop.variables]
+
+    def upper(box):
+        return sum(evaluate(c, box)[1] for c in cost)
+
+    def sample(box):
+        point = {n : ((box[n][0] + box[n][1]) / 2,) * 2 for n in names}
+        if not all(satisfied(c, point) for c in constraints):
+            return None
+        value = sum(evaluate(c, point)[0] for c in cost)
+        return value if math.isfinite(value) else None
+
+    start = time.time()
+    root = {name : (low, high) for name, low, high in dop.variables}
+    inner = sample(root)
+    queue = [(-upper(root), 0, root)]
+    count = 1
+    for _ in range(max_iters):
+        if timeout > 0 and time.time() - start > timeout:
+            break
+        bound, _, box = heapq.heappop(queue)
+        if inner is not None and -bound - inner <= 1e-9*max(1.0, abs(inner)):
+            heapq.heappush(queue, (bound, 0, box))
+            break
+        name = max(names, key=lambda n: box[n][1] - box[n][0])
+        low, high = box[name]
+        middle = (low + high) / 2
+        for part in [(low, middle), (middle, high)]:
+            child = dict(box)
+            child[name] = part
+            value = sample(child)
+            if value is not None and (inner is None or value > inner):
+                inner = value
+            heapq.heappush(queue, (-upper(child), count, child))
+            count += 1
+    return inner, -queue[0][0]
+
+
+def optimize(filename, mode, timeout, max_iters):
+    ''' Prints the answer for one file in gelpia's format '''
+    dop = read_dop(filename)
+    cost = [parse_expression(c) for c in dop.cost]
+    if mode == "max":
+        inner, outer = maximize(dop, cost, timeout, max_iters)
+        if inner is not None:
+            print("Maximum lower bound {}".format(inner))
+        print("Maximum upper bound {}".format(outer))
+        return
+
+    # Minimizing the cost is maximizing its negation
+    inner, outer = maximize(dop, [("neg", c) for c in cost], timeout,
+                            max_iters)
+    print("Minimum lower bound {}".format(-outer))
+    if inner is not None:
+        print("Minimum upper bound {}".format(-inner))
+
+
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Stand-in optimizer answering like gelpia, for testing the tester")
+    parser.add_argument("--mode",
+                        choices=["min", "max"],
+                        default="max")
+    parser.add_argument("--timeout",
+                        help="Time limit in seconds for each file, 0 for none",
+                        type=float,
+                        default=0)
+    parser.add_argument("--max-iters",
+                        type=int,
+                        default=2000)
+    parser.add_argument("--batch",
+                        help="Run every file, bracketing each one's output with batch markers",
+                        action='store_const',
+                        const=True,
+                        default=False)
+    parser.add_argument("--startup",
+                        help="Seconds to sleep before the first file, to imitate a tool's start up cost",
+                        type=float,
+                        default=0)
+    parser.add_argument("--crash-on",
+                        help="Exit abruptly on files whose path contains this text, for testing",
+                        type=str)
+    parser.add_argument("--hang-on",
+                        help="Never finish files whose path contains this text, for testing",
+                        type=str)
+    parser.add_argument("files", nargs="+")
+
+    args = parser.parse_args(args=argv[1:])
+    if len(args.files) > 1 and not args.batch:
+        parser.error("several files require --batch")
+    return args
+
+
+def run_file(args, filename):
+    if args.crash_on is not None and args.crash_on in filename:
+        sys.stdout.flush()
+        sys.exit(70)
+    if args.hang_on is not None and args.hang_on in filename:
+        while True:
+            time.sleep(60)
+    optimize(filename, args.mode, args.timeout, args.max_iters)
+
+
+def main(argv):
+    args = parse_args(argv)
+    time.sleep(args.startup)
+
+    if not args.batch:
+        run_file(args, args.files[0])
+        return 0
+
+    for filename in args.files:
+        print(begin_marker(filename), flush=True)
+        start = time.time()
+        retcode = 0
+        try:
+            run_file(args, filename)
+        except (OSError, ValueError) as e:
+            print("ERROR: {}".format(e))
+            retcode = 1
+        print(end_marker(filename, time.time() - start, retcode), flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
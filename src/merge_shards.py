@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+
+from regression_file import read_regressionfile, write_regressionfile
+from summary import print_summaries
+from test import Test
+
+import argparse
+import re
+import sys
+
+
+
+
+ANSI_REGEX = re.compile(r"\033\[[0-9;]*m")
+
+REVERSE_DIFF_REGEX = re.compile(r"^([A-Z_]+) *: (\d+)$")
+
+
+
+
+class Row():
+    ''' The states of one benchmark as printed in a tester TSV row '''
+    def __init__(self, fields):
+        self.tool = fields.get("Tool")
+        # Output from before the Path column only has the file name
+        self.path = fields.get("Path", fields["Benchmark"])
+        self.has_path = "Path" in fields
+        self.answer_range = (fields["AnswerLow"], fields["AnswerHigh"])
+        self.elapsed = fields["Elapsed"]
+        self.main_state = fields["MainState"]
+        self.strict_state = fields["StrictState"]
+        self.width_state = fields["WidthState"]
+        self.regression_state = fields.get("RegressionState", "NOT_APPLICABLE")
+
+    def regression_row(self):
+        return "\t".join([self.path,
+                          self.answer_range[0],
+                          self.answer_range[1],
+                          self.elapsed])
+
+
+
+
+def read_tester_output(filename):
+    '''
+    Returns the TSV header and rows printed by one tester run, other output
+    such as crashed tool logs is skipped
+    '''
+    with open(filename, "r") as f:
+        lines = [ANSI_REGEX.sub("", l.rstrip("\n")) for l in f]
+    header = None
+    rows = list()
+    for line in lines:
+        parts = line.split("\t")
+        if header is None:
+            if "Benchmark" in parts and "MainState" in parts:
+                header = parts
+            continue
+        if len(parts) != len(header):
+            continue
+        fields = dict(zip(header, parts))
+        if fields["MainState"] in Test.MAIN_STATES:
+            rows.append(Row(fields))
+    return header, rows
+
+
+def read_reverse_diff_output(filename):
+    ''' Returns the final status tallies printed by reverse_diff_tester '''
+    with open(filename, "r") as f:
+        lines = [ANSI_REGEX.sub("", l).strip() for l in f]
+    counts = dict()
+    for line in lines:
+        match = REVERSE_DIFF_REGEX.match(line)
+        if match is not None and match.group(1) != "TOTAL":
+            counts[match.group(1)] = int(match.group(2))
+    return counts
+
+
+def merge_regression_files(filenames, output):
+    regressions = [read_regressionfile(f) for f in filenames]
+    first = regressions[0]
+    for filename, r in zip(filenames, regressions):
+        if ((r.flags, r.timeout, r.mode, r.abs_tol, r.rel_tol)
+            != (first.flags, first.timeout, first.mode, first.abs_tol, first.rel_tol)):
+            raise ValueError("'{}' was run with different settings than '{}'".format(
+                filename, filenames[0]))
+    rows = list()
+    seen = dict()
+    for filename, r in zip(filenames, regressions):
+        for path, (low, high) in r.ranges.items():
+            if path in seen:
+                raise ValueError("'{}' is in both '{}' and '{}', check the shard specifications".format(
+                    path, seen[path], filename))
+            seen[path] = filename
+            row = Row({"Benchmark"   : path,
+                       "AnswerLow"   : str(low),
+                       "AnswerHigh"  : str(high),
+                       "Elapsed"     : str(r.elapsed[path]),
+                       "MainState"   : "NOT_RAN",
+                       "StrictState" : "NOT_APPLICABLE",
+                       "WidthState"  : "NOT_APPLICABLE"})
+            rows.append(row)
+    rows.sort(key=lambda r: r.path)
+    write_regressionfile(output, first.flags, first.timeout, first.mode,
+                         first.abs_tol, first.rel_tol, rows)
+
+
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Combine the outputs of sharded tester or reverse_diff_tester runs")
+    parser.add_argument("--regression",
+                        help="Regression file written by one shard with -o, may be repeated",
+                        type=str,
+                        action="append",
+                        default=[])
+    parser.add_argument("-o",
+                        help="Where to write the merged regression file",
+                        type=str)
+    parser.add_argument("outputs",
+                        help="Captured stdout of each shard",
+                        nargs="*")
+
+    args = parser.parse_args(args=argv[1:])
+    if args.o is not None and args.regression == []:
+        parser.error("-o requires at least one --regression file")
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+
+    tester_rows = list()
+    do_regression = False
+    tools = list()
+    reverse_counts = dict()
+    seen = dict()
+    for filename in args.outputs:
+        header, rows = read_tester_output(filename)
+        if header is not None:
+            do_regression |= "RegressionState" in header
+            tester_rows.extend(rows)
+            for r in rows:
+                if r.tool not in tools:
+                    tools.append(r.tool)
+                if not r.has_path:
+                    continue
+                if (r.tool, r.path) in seen:
+                    print("'{}' is in both '{}' and '{}', check the shard specifications".format(
+                        r.path, seen[(r.tool, r.path)], filename))
+                    return 1
+                seen[(r.tool, r.path)] = filename
+            continue
+        counts = read_reverse_diff_output(filename)
+        if counts == {}:
+            print("Unable to find tester or reverse_diff_tester results in '{}'".format(filename))
+            return 1
+        for k, v in counts.items():
+            reverse_counts[k] = reverse_counts.get(k, 0) + v
+
+    retval = 0
+    if tester_rows:
+        print("{} benchmarks merged from {} shards\n".format(len(tester_rows),
+                                                             len(args.outputs)))
+        retval = print_summaries(tools, tester_rows, do_regression)
+
+    if reverse_counts:
+        maxlabel = max(len(s) for s in list(reverse_counts) + ["TOTAL"])
+        fmtstr = "{{:{}}}".format(maxlabel)
+        for status in sorted(reverse_counts):
+            print("{} : {}".format(fmtstr.format(status), reverse_counts[status]))
+        print("\n{} : {}".format(fmtstr.format("TOTAL"),
+                                 sum(reverse_counts.values())))
+
+    if args.o is not None:
+        try:
+            merge_regression_files(args.regression, args.o)
+        except ValueError as e:
+            print(e)
+            return 1
+
+    return retval
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,201 @@
+from color_printing import *
+from execution import Execution
+
+import contextlib
+import cProfile
+import hashlib
+import io
+import os
+import os.path as path
+import pstats
+import re
+import runpy
+import shlex
+import shutil
+import sys
+import traceback
+
+
+
+
+# Lines of a profiler report that carry a sample share, such as perf's
+#   "    12.34%  gelpia  libm.so.6  [.] __sin_fma"
+PERCENT_REGEX = re.compile(r"^\s*\d+(\.\d+)?%")
+
+
+
+
+class Profile():
+    ''' The outcome of profiling one benchmark '''
+    def __init__(self, name, reason, artifact, hotspots, error=None,
+                 note=None):
+        self.name = name
+        self.reason = reason
+        self.artifact = artifact
+        self.hotspots = hotspots
+        self.error = error
+        self.note = note
+
+
+
+
+def profile_reason(t, slow_factor):
+    '''
+    Why a test should be profiled, or None. Tests are profiled when they
+    regressed FAR_WORSE or ran slow_factor times longer than their estimate.
+    '''
+    if t.regression_state == "FAR_WORSE":
+        return "FAR_WORSE"
+    if (t.estimate is not None and t.execution.elapsed is not None
+        and t.main_state in {"RAN", "RAN_OUT", "TIMEOUT"}
+        and t.execution.elapsed > slow_factor * max(t.estimate, 1.0)):
+        return "SLOW x{:.1f}".format(t.execution.elapsed / max(t.estimate, 1e-9))
+    return None
+
+
+def artifact_base(directory, filename, tool):
+    '''
+    Artifact path without extension, benchmarks with the same name in
+    different directories are told apart by a hash of their path
+    '''
+    digest = hashlib.sha1(path.abspath(filename).encode()).hexdigest()[:8]
+    return path.join(directory, "{}.{}.{}".format(path.basename(filename),
+                                                  digest, tool))
+
+
+def report_hotspots(text, top):
+    '''
+    The first top lines of a profiler's text report that look like samples,
+    or the first top non comment lines if none do
+    '''
+    lines = [l.rstrip() for l in text.splitlines()]
+    lines = [l for l in lines if l.strip() != "" and not l.lstrip().startswith("#")]
+    samples = [l for l in lines if PERCENT_REGEX.match(l)]
+    return [l.strip() for l in (samples or lines)[:top]]
+
+
+def load_python_stats(artifact):
+    ''' The pstats.Stats in an artifact, or None if it is not a Python profile '''
+    try:
+        return pstats.Stats(artifact, stream=io.StringIO())
+    except (ValueError, EOFError):
+        # marshal rejects other formats
+        return None
+    except (TypeError, AttributeError):
+        # Marshalled data which is not a stats table
+        return None
+
+
+def python_hotspots(stats, top):
+    ''' The functions with the most own time in a pstats.Stats '''
+    entries = sorted(stats.stats.items(), key=lambda e: -e[1][2])
+    hotspots = list()
+    for (filename, line, function), (cc, nc, tt, ct, callers) in entries[:top]:
+        hotspots.append("{:8.3f}s {:8.3f}s cum  {} ({}:{})".format(
+            tt, ct, function, path.basename(filename), line))
+    return hotspots
+
+
+
+
+class WrapperProfiler():
+    '''
+    Reruns tool commands under an external sampling profiler.
+
+    wrapper is a command prefix with an {output} placeholder for the profile
+    artifact, report is a command with the same placeholder which prints the
+    artifact as text. Benchmarks are rerun one at a time so that samples are
+    not skewed by other runs.
+    '''
+    def __init__(self, wrapper, report, directory, top=5):
+        self.wrapper = wrapper
+        self.report = report
+        self.directory = directory
+        self.top = top
+
+    def available(self):
+        commands = [self.wrapper] + ([self.report] if self.report else [])
+        return all(shutil.which(shlex.split(c)[0]) is not None
+                   for c in commands)
+
+    def profile(self, t, reason):
+        os.makedirs(self.directory, exist_ok=True)
+        base = artifact_base(self.directory, t.path, t.tool)
+        artifact = base + ".prof"
+        command = "{} {}".format(self.wrapper.format(output=artifact),
+                                 t.execution.command)
+        execution = Execution(command, t.execution.kill_after)
+        execution.run()
+        with open(base + ".out", "w") as f:
+            f.write(execution.stdout or "")
+            f.write(execution.stderr or "")
+        if not path.exists(artifact):
+            return Profile(t.path, reason, None, [],
+                           "profiler wrote no artifact, see {}".format(base + ".out"))
+
+        hotspots = list()
+        note = None
+        if self.report is not None:
+            report = Execution(self.report.format(output=artifact))
+            report.run()
+            with open(base + ".txt", "w") as f:
+                f.write(report.stdout or "")
+            hotspots = report_hotspots(report.stdout or "", self.top)
+
+        # Artifacts from Python's own profilers are summarized directly
+        stats = load_python_stats(artifact)
+        if stats is not None:
+            hotspots = python_hotspots(stats, self.top)
+        elif self.report is None:
+            note = "not a Python profile, no report command to summarize it"
+        return Profile(t.path, reason, artifact, hotspots, note=note)
+
+
+
+
+def profile_script(script, argv, artifact, top=5):
+    '''
+    Runs a Python script in this process under cProfile, as if it were run
+    with the given arguments. Returns (hotspots, captured output, error),
+    error is None unless the script raised. Stats are kept either way.
+    '''
+    profiler = cProfile.Profile()
+    output = io.StringIO()
+    saved_argv = sys.argv
+    saved_path = list(sys.path)
+    sys.argv = [script] + list(argv)
+    sys.path.insert(0, path.dirname(path.abspath(script)))
+    error = None
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                profiler.runcall(runpy.run_path, script, run_name="__main__")
+            except SystemExit:
+                pass
+            except Exception as e:
+                traceback.print_exc()
+                error = "script raised {}: {}".format(type(e).__name__, e)
+    finally:
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+    profiler.dump_stats(artifact)
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    return python_hotspots(stats, top), output.getvalue(), error
+
+
+def print_profiles(profiles):
+    if profiles == []:
+        return
+    print("PROFILES")
+    for p in profiles:
+        print("{} ({})".format(bold(p.name), p.reason))
+        if p.error is not None:
+            print("  {}".format(red(p.error)))
+        if p.artifact is None:
+            continue
+        print("  artifact: {}".format(p.artifact))
+        if p.note is not None:
+            print("  {}".format(p.note))
+        for h in p.hotspots:
+            print("    {}".format(h))
+    print()
@@ -0,0 +1,166 @@
+from color_printing import *
+from test import Test
+
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+
+
+
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return "{}s".format(seconds)
+    if seconds < 3600:
+        return "{}m{:02d}s".format(seconds // 60, seconds % 60)
+    return "{}h{:02d}m".format(seconds // 3600, (seconds % 3600) // 60)
+
+
+
+
+class Progress():
+    '''
+    Live status line for a sweep, redrawn in place below the TSV rows.
+
+    Shows completed/total, a tally of main states, throughput, the running
+    benchmarks with how long each has been running, and an ETA from the
+    tests' estimated times. A benchmark running longer than slow_factor times
+    its estimate is flagged with '!'.
+    '''
+    def __init__(self, tests, procs, slow_factor=3.0, interval=1.0,
+                 stream=sys.stdout):
+        self.total = len(tests)
+        self.procs = procs
+        self.slow_factor = slow_factor
+        self.interval = interval
+        self.stream = stream
+        self.completed = 0
+        self.states = {k:0 for k in Test.MAIN_STATES}
+        self.pending = set(tests)
+        self.running = dict()
+        self.start_time = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+        known = [t.estimate for t in tests if t.estimate is not None]
+        self.default_estimate = statistics.median(known) if known else None
+
+    @staticmethod
+    def enabled():
+        return is_color_printing()
+
+    def start(self):
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.refresh_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            self.clear()
+            self.stream.flush()
+
+    def started(self, t):
+        with self.lock:
+            self.pending.discard(t)
+            self.running[t] = time.time()
+
+    def finished(self, t, row):
+        with self.lock:
+            self.pending.discard(t)
+            self.running.pop(t, None)
+            self.completed += 1
+            self.states[t.main_state] += 1
+            self.clear()
+            print(row, file=self.stream)
+            self.draw()
+
+    def message(self, text):
+        with self.lock:
+            self.clear()
+            print(text, file=self.stream)
+            self.draw()
+
+    def refresh_loop(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                self.clear()
+                self.draw()
+
+    def clear(self):
+        self.stream.write("\r\033[K")
+
+    def draw(self):
+        self.stream.write(self.status_line())
+        self.stream.flush()
+
+    def estimate(self, t):
+        if t.estimate is not None:
+            return t.estimate
+        if self.default_estimate is not None:
+            return self.default_estimate
+        # Without any estimates fall back to the average so far
+        done = time.time() - self.start_time
+        return done * self.procs / self.completed if self.completed else None
+
+    def eta(self, now):
+        remaining = 0.0
+        for t in self.pending:
+            e = self.estimate(t)
+            if e is None:
+                return None
+            remaining += e
+        for t, started in self.running.items():
+            e = self.estimate(t)
+            if e is None:
+                return None
+            remaining += max(e - (now - started), 0.0)
+        return remaining / self.procs
+
+    def status_line(self):
+        now = time.time()
+        parts = ["{}/{}".format(self.completed, self.total)]
+        parts.append(" ".join(Test.MAIN_STATES_FMT[k]("{}:{}".format(k, v))
+                              for k, v in self.states.items() if v != 0))
+        if self.completed:
+            rate = 60 * self.completed / max(now - self.start_time, 1e-9)
+            parts.append("{:.1f}/min".format(rate))
+        eta = self.eta(now)
+        if eta is not None:
+            parts.append("ETA {}".format(format_seconds(eta)))
+
+        running = list()
+        for t, started in sorted(self.running.items(), key=lambda p: p[1]):
+            elapsed = now - started
+            text = "{} {}".format(t.name, format_seconds(elapsed))
+            if (t.estimate is not None
+                and elapsed > self.slow_factor * max(t.estimate, 1.0)):
+                text = red(bold(text + "!"))
+            running.append(text)
+        if running:
+            parts.append("running: " + ", ".join(running))
+
+        # Keep to one terminal line, color codes take no width
+        line = " | ".join(p for p in parts if p != "")
+        width = shutil.get_terminal_size().columns - 1
+        visible = 0
+        out = list()
+        i = 0
+        while i < len(line):
+            if line[i] == "\033":
+                end = line.index("m", i) + 1
+                out.append(line[i:end])
+                i = end
+                continue
+            if visible == width:
+                break
+            out.append(line[i])
+            visible += 1
+            i += 1
+        return "".join(out) + "\033[0m"
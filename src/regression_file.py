@@ -0,0 +1,79 @@
+from test import Test
+
+
+
+
+HEADER_FIELDS = {
+    "flags"   : str,
+    "timeout" : int,
+    "mode"    : str,
+    "abs_tol" : float,
+    "rel_tol" : float,
+}
+
+
+
+
+class RegressionFile():
+    '''
+    Contents of a baseline written by "tester -o".
+
+    ranges maps each benchmark path to its (low, high) answer and elapsed to
+    its run time, benchmarks are kept in file order.
+    '''
+    def __init__(self, flags, timeout, mode, abs_tol, rel_tol):
+        self.flags = flags
+        self.timeout = timeout
+        self.mode = mode
+        self.abs_tol = abs_tol
+        self.rel_tol = rel_tol
+        self.ranges = dict()
+        self.elapsed = dict()
+
+
+
+
+def parse_optional_float(text):
+    return None if text == "None" else float(text)
+
+
+def read_regressionfile(filename):
+    with open(filename, "r") as f:
+        lines = f.readlines()
+    header = dict()
+    regression = None
+    for line in lines:
+        line = line.strip()
+        if line == "":
+            continue
+        if regression is None:
+            if line == Test.regression_header():
+                regression = RegressionFile(**header)
+                continue
+            key, _, value = line.partition(":")
+            if key in HEADER_FIELDS:
+                header[key] = HEADER_FIELDS[key](value.strip())
+            continue
+        parts = line.split("\t")
+        regression.ranges[parts[0]] = (parse_optional_float(parts[1]),
+                                       parse_optional_float(parts[2]))
+        regression.elapsed[parts[0]] = parse_optional_float(parts[3])
+    return regression
+
+
+def write_regressionfile(filename, flags, timeout, mode, abs_tol, rel_tol,
+                         tests):
+    lines = list()
+    lines.append("flags: {}".format(flags))
+    lines.append("timeout: {}".format(timeout))
+    lines.append("mode: {}".format(mode))
+    lines.append("abs_tol: {}".format(abs_tol))
+    lines.append("rel_tol: {}".format(rel_tol))
+    lines.append("")
+    lines.append(Test.regression_header())
+    for t in tests:
+        lines.append(t.regression_row())
+    lines.append("")
+    data = "\n".join(lines)
+    with open(filename, "w") as f:
+        f.write(data)
@@ -3,6 +3,7 @@
 import argparse
 import glob
 import multiprocessing
+import os
 import re
 import struct
 import subprocess
@@ -13,6 +14,8 @@ import multiprocessing.pool as pool
 import os.path as path
 
 from color_printing import *
+from profiling import Profile, artifact_base, print_profiles, profile_script
+from sharding import parse_shard, select_shard
 
 
 STATUS_FMT = {
@@ -92,12 +95,12 @@ def get_expected(filename):
 def process_test(cmd, test, expected):
     '''
     Runs given test and compares the result to the expected result
-    returns a status string and a state string
+    returns a status string, a state string, the test and its time
     '''
     cmd = " ".join(cmd)
 
+    t0 = time.time()
     try:
-        t0 = time.time()
         p = subprocess.Popen(cmd, shell=True,
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         out, err  = p.communicate()
@@ -130,6 +133,7 @@ def process_test(cmd, test, expected):
 
         result = ""
         state = "CRASH"
+        elapsed = time.time() - t0
 
     printstate = STATUS_FMT[state](state)
     expected_str = ['unknown'] if expected is None else expected
@@ -140,18 +144,52 @@ def process_test(cmd, test, expected):
     str_result += "Result:\n  {}".format("  ".join(result))
     str_result += "Time: {}\n\n".format(elapsed)
 
-    return str_result, state
+    return str_result, state, test, elapsed
 
 
 def tally_result(tup):
     ''' Combines results of test runners '''
-    str_result, state = tup
+    str_result, state, test, elapsed = tup
     if VERBOSE == True or state in {"INCORRECT", "CRASH"}:
         print(str_result, flush=True)
     STATUS_COUNT[state] += 1
+    TIMES[test] = (state, elapsed)
+
+
+def profile_regressions(exe, directory, slow, top):
+    '''
+    Reruns failed tests, and tests slower than slow seconds, one at a time
+    under cProfile in this process
+    '''
+    chosen = list()
+    for test in sorted(TIMES):
+        state, elapsed = TIMES[test]
+        if state in {"INCORRECT", "CRASH"}:
+            chosen.append((test, state))
+        elif slow is not None and elapsed > slow:
+            chosen.append((test, "SLOW {:.2f}s".format(elapsed)))
+    if chosen == []:
+        return []
+
+    os.makedirs(directory, exist_ok=True)
+    print("Profiling {} benchmarks into '{}'".format(len(chosen), directory),
+          flush=True)
+    profiles = list()
+    for test, reason in chosen:
+        base = artifact_base(directory, test, path.basename(exe))
+        artifact = base + ".pstats"
+        hotspots, output, error = profile_script(exe, [test, "test"],
+                                                 artifact, top)
+        with open(base + ".out", "w") as f:
+            f.write(output)
+        if error is not None:
+            error = "{}, see {}".format(error, base + ".out")
+        profiles.append(Profile(test, reason, artifact, hotspots, error))
+    return profiles
 
 
 VERBOSE = False
+TIMES = dict()
 def main():
     global VERBOSE
 
@@ -171,8 +209,24 @@ def main():
     parser.add_argument("-v", action='store_const',
                         const=True, default=False,
                         help="Print all test outputs")
+    parser.add_argument("--shard", type=str,
+                        help="Only run shard i of N (given as i/N)")
+    parser.add_argument("--profile-regressions", action='store_const',
+                        const=True, default=False,
+                        help="Rerun incorrect, crashed and slow tests under cProfile")
+    parser.add_argument("--profile-slow", type=float,
+                        help="Also profile tests taking longer than this many seconds")
+    parser.add_argument("--profile-dir", type=str, default="profiles",
+                        help="Directory for profile artifacts")
+    parser.add_argument("--profile-top", type=int, default=5,
+                        help="Number of hotspots to print for each profiled test")
     parser.add_argument("benchmark_dir")
     args = parser.parse_args()
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
 
     exe = args.rd
     VERBOSE = args.v
@@ -187,6 +241,8 @@ def main():
         tests = sorted(glob.glob(path.join(args.benchmark_dir,"**"),
                                  recursive=True))
         tests = [f for f in tests if f.endswith(".dop")]
+        if args.shard is not None:
+            tests = select_shard(tests, args.shard, key=lambda t: t)
         total = len(tests)
         print("{} benchmarks to process".format(total))
 
@@ -220,11 +276,16 @@ def main():
         print("\nCaught KeyboardInterrupt, terminating workers")
         p.terminate() # terminate any remaining workers
         p.join()
+        profiles = []
     else:
         print("\nQuitting normally")
         # close the pool. this prevents any more tasks from being submitted.
         p.close()
         p.join() # wait for all workers to finish their tasks
+        profiles = []
+        if args.profile_regressions:
+            profiles = profile_regressions(exe, args.profile_dir,
+                                           args.profile_slow, args.profile_top)
 
     # log the elapsed time
     elapsed_time = time.time() - t0
@@ -240,6 +301,9 @@ def main():
         print("{} : {}".format(STATUS_FMT[status](label), STATUS_COUNT[status]))
     label = fmtstr.format("TOTAL")
     print("\n{} : {}".format(label, tests_ran))
+    if profiles != []:
+        print()
+    print_profiles(profiles)
 
     if (total != sum(STATUS_COUNT.values())):
         print(red("\nERROR:")+"number of tests ran({}) does not equal total tests({}), there is a bug in {}".format(tests_ran, total, sys.argv[0]))
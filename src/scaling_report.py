@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+
+from color_printing import *
+from dop_file import read_dop
+from test import Test
+from tool_adapter import ADAPTERS, make_adapter
+
+import argparse
+import math
+import os
+import os.path as path
+import sys
+
+
+
+
+def fit_line(xs, ys):
+    '''
+    Least squares fit of ys = a + b*xs, returns (a, b, r_squared)
+    '''
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x)**2 for x in xs)
+    sxy = sum((x - mean_x)*(y - mean_y) for x, y in zip(xs, ys))
+    syy = sum((y - mean_y)**2 for y in ys)
+    b = sxy / sxx if sxx != 0 else 0.0
+    a = mean_y - b*mean_x
+    r_squared = 1.0 if syy == 0 else (sxy*sxy) / (sxx*syy)
+    return a, b, r_squared
+
+
+def fit_growth(dimensions, values):
+    '''
+    Fits values against dimension both as exponential growth, log(v) linear
+    in d, and as a power law, log(v) linear in log(d). Returns a description
+    of the better fit, or None with fewer than three points.
+    '''
+    points = [(d, v) for d, v in zip(dimensions, values) if v is not None]
+    if len(points) < 3:
+        return None
+    ds = [d for d, v in points]
+    logs = [math.log(max(v, 1e-6)) for d, v in points]
+
+    _, rate, exp_r2 = fit_line(ds, logs)
+    _, power, pow_r2 = fit_line([math.log(d) for d in ds], logs)
+    if exp_r2 >= pow_r2:
+        return "exponential x{:.2f} per variable (R^2 {:.2f})".format(
+            math.exp(rate), exp_r2)
+    return "power law d^{:.2f} (R^2 {:.2f})".format(power, pow_r2)
+
+
+def find_benchmarks(benchmark_dir):
+    '''
+    Returns {family: [(dimension, filename)]} for every .dop file below
+    benchmark_dir, the family being the directory a file is in
+    '''
+    families = dict()
+    for dirpath, dirnames, filenames in os.walk(benchmark_dir):
+        for name in filenames:
+            if not name.endswith(".dop"):
+                continue
+            filename = path.join(dirpath, name)
+            family = path.basename(dirpath)
+            dimension = read_dop(filename).dimension
+            families.setdefault(family, list()).append((dimension, filename))
+    for benchmarks in families.values():
+        benchmarks.sort()
+    return families
+
+
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Measure how a tool's run time and memory grow with dimension on generated benchmark families")
+    parser.add_argument("--exe",
+                        help="What executable to run",
+                        type=str,
+                        default="gelpia")
+    parser.add_argument("--tool",
+                        help="Tool to measure as 'name' or 'name=exe'. Known tools: {}".format(", ".join(sorted(ADAPTERS))),
+                        type=str)
+    parser.add_argument("--flags",
+                        help="Additional command line arguments for the tool under test, should not contain time limit or optimization mode",
+                        default="",
+                        type=str,
+                        nargs="?")
+    parser.add_argument("--timeout",
+                        help="Per test time limit in seconds",
+                        type=int,
+                        default=60)
+    parser.add_argument("--min",
+                        help="Find minimums instead of maximum",
+                        action='store_const',
+                        const=True,
+                        default=False)
+    parser.add_argument("--keep-going",
+                        help="Keep running higher dimensions of a family after one times out",
+                        action='store_const',
+                        const=True,
+                        default=False)
+    parser.add_argument("benchmark_dir",
+                        help="Directory written by generate_benchmarks, each sub directory is fitted as one series")
+
+    args = parser.parse_args(args=argv[1:])
+    if args.tool is None:
+        args.tool = "gelpia={}".format(args.exe)
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    adapter = make_adapter(args.tool, args.flags)
+    mode = "MIN" if args.min else "MAX"
+    if not adapter.supports(mode):
+        print("{} does not support {} mode".format(adapter.NAME, mode))
+        return 1
+
+    families = find_benchmarks(args.benchmark_dir)
+    if families == {}:
+        print("No .dop files found in '{}'".format(args.benchmark_dir))
+        return 1
+
+    # Benchmarks are run one at a time so that time and memory are not
+    # disturbed by other runs
+    print("\t".join(["Family", "Dimension", "Elapsed", "MaxRSSMB",
+                     "MainState", "StrictState"]))
+    results = dict()
+    for family in sorted(families):
+        results[family] = list()
+        for dimension, filename in families[family]:
+            t = Test(adapter, filename, mode, 1e-12, 0.01, args.timeout)
+            t.run()
+            rss = t.execution.max_rss
+            rss = None if rss is None else rss / 1024
+            results[family].append((dimension, t, rss))
+            print("\t".join(str(v) for v in [
+                family, dimension,
+                "{:.3f}".format(t.execution.elapsed),
+                "{:.1f}".format(rss) if rss is not None else "None",
+                Test.MAIN_STATES_FMT[t.main_state](t.main_state),
+                Test.STRICT_STATES_FMT[t.strict_state](t.strict_state)]),
+                  flush=True)
+            if (t.main_state in {"TIMEOUT", "RAN_OUT"}
+                and not args.keep_going):
+                break
+
+    print("\nSCALING")
+    for family in sorted(results):
+        finished = [(d, t, rss) for d, t, rss in results[family]
+                    if t.main_state == "RAN"]
+        limit = [d for d, t, rss in results[family]
+                 if t.main_state in {"TIMEOUT", "RAN_OUT"}]
+        time_fit = fit_growth([d for d, t, rss in finished],
+                              [t.execution.elapsed for d, t, rss in finished])
+        memory_fit = fit_growth([d for d, t, rss in finished],
+                                [rss for d, t, rss in finished])
+
+        print(bold(family))
+        if finished:
+            print("  largest finished : d={}".format(finished[-1][0]))
+        if limit:
+            print("  first timeout    : {}".format(
+                red("d={}".format(min(limit)))))
+        print("  time             : {}".format(time_fit or "too few points"))
+        print("  memory           : {}".format(memory_fit or "too few points"))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,81 @@
+import hashlib
+import statistics
+
+
+
+
+# How far above the average load a shard may go before benchmarks spill over
+# to their next preferred shard
+SLACK = 0.10
+
+
+
+
+def parse_shard(text):
+    '''
+    Parses "i/N" with 1 <= i <= N into a zero based (index, count) pair
+    '''
+    index, sep, count = text.partition("/")
+    try:
+        index = int(index)
+        count = int(count)
+    except ValueError:
+        raise ValueError("Shard must be given as i/N, not '{}'".format(text))
+    if sep != "/" or count < 1 or not 1 <= index <= count:
+        raise ValueError("Shard must be given as i/N with 1 <= i <= N, not '{}'".format(text))
+    return index - 1, count
+
+
+def preference(name, count):
+    ''' Shards ordered by rendezvous hash, stable for a given name '''
+    def weight(shard):
+        key = "{}\0{}".format(name, shard).encode("utf-8")
+        return hashlib.sha1(key).hexdigest()
+    return sorted(range(count), key=weight, reverse=True)
+
+
+def assign_shards(costs, count):
+    '''
+    Splits benchmarks into count shards of similar total cost.
+
+    costs maps benchmark names to expected run time, None where unknown. Each
+    benchmark goes to the first shard in its rendezvous hash preference that
+    stays within capacity, so adding or removing a benchmark moves few
+    others. Benchmarks are placed most expensive first.
+
+    Returns a dict mapping benchmark names to zero based shard indices.
+    '''
+    known = [c for c in costs.values() if c is not None]
+    default = statistics.median(known) if known else 1.0
+    costs = {name : (default if c is None else max(c, 0.0))
+             for name, c in costs.items()}
+
+    capacity = (1.0 + SLACK) * sum(costs.values()) / count
+    loads = [0.0] * count
+    shards = dict()
+    for name in sorted(costs, key=lambda n: (-costs[n], n)):
+        choices = preference(name, count)
+        fitting = [s for s in choices if loads[s] + costs[name] <= capacity]
+        shard = fitting[0] if fitting else min(choices, key=lambda s: loads[s])
+        shards[name] = shard
+        loads[shard] += costs[name]
+    return shards
+
+
+def select_shard(items, shard, key, cost=None):
+    '''
+    Returns the items of the given (index, count) shard in their original
+    order. key gives the name items are sharded by, items sharing a name stay
+    together, and cost gives an item's expected run time or None.
+    '''
+    index, count = shard
+    costs = dict()
+    for item in items:
+        c = None if cost is None else cost(item)
+        name = key(item)
+        if name not in costs or costs[name] is None:
+            costs[name] = c
+        elif c is not None:
+            costs[name] += c
+    shards = assign_shards(costs, count)
+    return [item for item in items if shards[key(item)] == index]
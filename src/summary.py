@@ -0,0 +1,68 @@
+from color_printing import *
+from test import Test
+
+
+
+
+def print_summary(tests, do_regression):
+    '''
+    Prints state tallies and returns the number of failing verdicts, tests
+    only need their main, strict, width and regression states
+    '''
+    main_states = {k:0 for k in Test.MAIN_STATES}
+    strict_states = {k:0 for k in Test.STRICT_STATES}
+    width_states = {k:0 for k in Test.WIDTH_STATES}
+    regression_states = {k:0 for k in Test.REGRESSION_STATES}
+
+    for t in tests:
+        main_states[t.main_state] += 1
+        strict_states[t.strict_state] += 1
+        width_states[t.width_state] += 1
+        regression_states[t.regression_state] += 1
+
+    print("MAIN_STATE")
+    for k in Test.MAIN_STATES:
+        fmt = Test.MAIN_STATES_FMT[k]
+        print("{}: {}".format(fmt(k), main_states[k]))
+    main_total = sum(v for v in main_states.values())
+    print("TOTAL: {}\n".format(main_total))
+
+    print("STRICT_STATE")
+    for k in Test.STRICT_STATES:
+        fmt = Test.STRICT_STATES_FMT[k]
+        print("{}: {}".format(fmt(k), strict_states[k]))
+    strict_total = sum(v for v in strict_states.values())
+    print("TOTAL: {}\n".format(strict_total))
+
+    print("WIDTH_STATE")
+    for k in Test.WIDTH_STATES:
+        fmt = Test.WIDTH_STATES_FMT[k]
+        print("{}: {}".format(fmt(k), width_states[k]))
+    width_total = sum(v for v in width_states.values())
+    print("TOTAL: {}\n".format(width_total))
+
+    if do_regression:
+        print("REGRESSION_STATE")
+        for k in Test.REGRESSION_STATES:
+            fmt = Test.REGRESSION_STATES_FMT[k]
+            print("{}: {}".format(fmt(k), regression_states[k]))
+        regression_total = sum(v for v in regression_states.values())
+        print("TOTAL: {}\n".format(regression_total))
+
+    return (main_states["CRASH"]
+            + main_states["FAILED"]
+            + strict_states["BROKEN"]
+            + regression_states["FAR_WORSE"])
+
+
+def print_summaries(tools, tests, do_regression):
+    '''
+    As print_summary, with one summary per tool when there are several
+    '''
+    retval = 0
+    for tool in tools:
+        if len(tools) > 1:
+            print(bold("TOOL: {}".format(tool)))
+        retval += print_summary([t for t in tests if t.tool == tool],
+                                do_regression)
+    return retval
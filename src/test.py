@@ -1,10 +1,11 @@
 
 
 from color_printing import *
+from dop_file import read_dop
+from execution import Execution
 
 import math
 import os.path as path
-import re
 
 
 
@@ -104,25 +105,27 @@ class Test():
         "FAR_BETTER"     : lambda t : bold(green(t)),
     }
 
-    def __init__(self, execution, bound, rel_bound, timeout):
-        self.execution = execution
+    def __init__(self, adapter, filename, mode, bound, rel_bound, timeout,
+                 expected=None):
+        self.adapter = adapter
+        self.path = filename
+        self.name = path.split(filename)[-1]
+        self.mode = mode
         self.bound = bound
         self.rel_bound = rel_bound
         self.timeout = timeout
 
-        self.mode = "MAX"
-        for part in execution.command.split():
-            if part.endswith(".dop"):
-                self.path = part
-                self.name = path.split(part)[-1]
-                continue
-            if part == "--mode=min":
-                self.mode = "MIN"
-                continue
+        command = None
+        if adapter.supports(mode):
+            command = adapter.command(filename, mode, timeout)
+        self.execution = Execution(command)
 
-        self.expected = self.extract_expected()
+        self.expected = expected
+        if self.expected is None:
+            self.expected = self.extract_expected()
 
         self.regression_range = None
+        self.estimate = None
         self.answer_range = None
         self.main_state = "NOT_RAN"
         self.strict_state = "NOT_APPLICABLE"
@@ -130,57 +133,57 @@ class Test():
         self.regression_state = "NOT_APPLICABLE"
 
     def extract_expected(self):
-        with open(self.path, 'r') as f:
-            data = f.read()
+        # None when the benchmark has no expected value for this mode
+        return read_dop(self.path).expected_value(self.mode)
 
-        min_match = re.search(r'\#[ \t]*minimum:[ \t]*([^ \n]+)', data)
-        max_match = re.search(r'\#[ \t]*maximum:[ \t]*([^ \n]+)', data)
-
-        expected_min = float(min_match.group(1))
-        expected_max = float(max_match.group(1))
-
-        if self.mode == "MIN":
-            return expected_min
-        return expected_max
+    @property
+    def tool(self):
+        return self.adapter.NAME
 
     def set_regression(self, regression_range):
         self.regression_range = regression_range
 
+    def set_estimate(self, elapsed):
+        # Expected run time in seconds, from a baseline or a runtime model
+        self.estimate = elapsed
+
+    def set_report(self, report):
+        # Where the tool's diagnostics are printed, see Execution
+        self.execution.report = report
+
     def run(self):
+        self.answer_range = (None, None)
+        if not self.adapter.supports(self.mode):
+            return
         self.execution.run()
-        self.answer_range = self.parse_answer()
+        if self.execution.aborted:
+            return
+        self.score_output()
+
+    def abort(self):
+        self.execution.abort()
+
+    def score_output(self):
+        self.score(self.adapter.parse_output(self.execution.stdout, self.mode))
+
+    def score(self, answer_range):
+        self.answer_range = answer_range
         self.main_state = self.calculate_main_state()
         self.strict_state = self.calculate_strict_state()
         self.width_state = self.calculate_width_state()
         self.regression_state = self.calculate_regression_state()
 
-    def parse_answer(self):
-        max_upper = None
-        max_lower = None
-        min_upper = None
-        min_lower = None
-
-        output = self.execution.stdout
-        max_upper_match = re.search(r"Maximum upper bound (.*)", output)
-        max_lower_match = re.search(r"Maximum lower bound (.*)", output)
-        min_upper_match = re.search(r"Minimum upper bound (.*)", output)
-        min_lower_match = re.search(r"Minimum lower bound (.*)", output)
-
-        if max_upper_match is not None:
-            max_upper = float(max_upper_match.group(1))
-        if max_lower_match is not None:
-            max_lower = float(max_lower_match.group(1))
-        if min_upper_match is not None:
-            min_upper = float(min_upper_match.group(1))
-        if min_lower_match is not None:
-            min_lower = float(min_lower_match.group(1))
-
-        if self.mode == "MIN":
-            return (min_lower, min_upper)
-        else:
-            return (max_lower, max_upper)
+    def failures(self):
+        '''
+        Number of failing verdicts, as counted by the tester exit code
+        '''
+        return ((self.main_state in {"CRASH", "FAILED"})
+                + (self.strict_state == "BROKEN")
+                + (self.regression_state == "FAR_WORSE"))
 
     def calculate_main_state(self):
+        if self.execution.killed:
+            return "TIMEOUT"
         if self.execution.retcode != 0:
             return "CRASH"
         if (self.execution.elapsed > self.timeout and
@@ -194,7 +197,8 @@ class Test():
         return "RAN"
 
     def calculate_strict_state(self):
-        if self.main_state not in {"RAN", "RAN_OUT"}:
+        if (self.main_state not in {"RAN", "RAN_OUT"}
+            or self.expected is None):
             return "NOT_APPLICABLE"
         comp = (lambda a,b: a<b) if self.mode == "MIN" else (lambda a,b: a>b)
         outer = self.answer_range[0] if self.mode == "MIN" else self.answer_range[1]
@@ -224,6 +228,8 @@ class Test():
         comp = (lambda a,b: a<b) if self.mode == "MIN" else (lambda a,b: a>b)
         outer = self.answer_range[0] if self.mode == "MIN" else self.answer_range[1]
         old_outer = self.regression_range[0] if self.mode == "MIN" else self.regression_range[1]
+        if old_outer is None:
+            return "NOT_APPLICABLE"
         abs_diff, rel_abs_diff = float_abs_diff(outer, old_outer)
         if abs_diff == 0.0:
             return "SAME"
@@ -237,7 +243,7 @@ class Test():
             return "FAR_WORSE"
 
     @staticmethod
-    def tsv_header(do_regression):
+    def tsv_header(do_regression, show_tool=False):
         header = ["Benchmark",
                   "Expected",
                   "AnswerLow",
@@ -248,9 +254,12 @@ class Test():
                   "WidthState"]
         if do_regression:
             header.append("RegressionState")
+        header.append("Path")
+        if show_tool:
+            header.insert(0, "Tool")
         return "\t".join(header)
 
-    def tsv_row(self):
+    def tsv_row(self, show_tool=False):
         row = [str(t) for t in [
             self.name,
             self.expected,
@@ -262,6 +271,9 @@ class Test():
             self.width_state]]
         if self.regression_range is not None:
             row.append(self.regression_state)
+        row.append(self.path)
+        if show_tool:
+            row.insert(0, self.adapter.NAME)
         return "\t".join(row)
 
     @staticmethod
@@ -1,76 +1,31 @@
 #!/usr/bin/env python3
 
 
+from batch import Batch
+from catalog import Catalog
 from color_printing import *
-from execution import Execution
+from dispatcher import Dispatcher
+from features import FeatureCache, RuntimeModel, predict_elapsed
+from fragility import fragility_scores
+from history import History
+from profiling import WrapperProfiler, print_profiles, profile_reason
+from progress import Progress
+from regression_file import read_regressionfile, write_regressionfile
+from sharding import parse_shard, select_shard
+from summary import print_summaries
 from test import Test
+from tool_adapter import ADAPTERS, make_adapter
 
 import argparse
 import glob
 import multiprocessing
 import os.path as path
+import statistics
 import sys
 
 
 
 
-def write_regressionfile(args, tests):
-    lines = list()
-    lines.append("flags: {}".format(args.flags))
-    lines.append("timeout: {}".format(args.timeout))
-    lines.append("mode: {}".format("MIN" if args.min else "MAX"))
-    lines.append("abs_tol: {}".format(args.abs_tol))
-    lines.append("rel_tol: {}".format(args.rel_tol))
-    lines.append("")
-    lines.append(Test.regression_header())
-    for t in tests:
-        lines.append(t.regression_row())
-    lines.append("")
-    data = "\n".join(lines)
-    with open(args.o, "w") as f:
-        f.write(data)
-
-def read_regressionfile(filename):
-    with open(filename, "r") as f:
-        lines = f.readlines()
-    seen_header = False
-    benchmarks = dict()
-    for line in lines:
-        line = line.strip()
-        if line == "":
-            continue
-        if not seen_header:
-            if line.startswith("flags: "):
-                flags = line[7:]
-                continue
-            if line.startswith("timeout: "):
-                timeout = int(line[9:])
-                continue
-            if line.startswith("mode: "):
-                mode = line[6:]
-                continue
-            if line.startswith("abs_tol: "):
-                abs_tol = float(line[8:])
-                continue
-            if line.startswith("rel_tol: "):
-                rel_tol = float(line[8:])
-                continue
-            if line == Test.regression_header():
-                seen_header = True
-                continue
-        parts = line.split("\t")
-        benchmarks[parts[0]] = (float(parts[1]), float(parts[2]))
-    return flags, timeout, mode, abs_tol, rel_tol, benchmarks
-
-def run_test(t):
-    try:
-        t.run()
-        print(t.tsv_row(), flush=True)
-    except KeyboardInterrupt as e:
-        raise e
-    return t
-
-
 def parse_args(argv):
   num_cpus = multiprocessing.cpu_count() // 2
 
@@ -79,6 +34,10 @@ def parse_args(argv):
                       help="What executable to run",
                       type=str,
                       default="gelpia")
+  parser.add_argument("--tool",
+                      help="Tool to benchmark as 'name' or 'name=exe', may be repeated to compare tools. Known tools: {}".format(", ".join(sorted(ADAPTERS))),
+                      type=str,
+                      action="append")
   parser.add_argument("--flags",
                       help="Additional command line arguments for the tool under test, should not contain time limit or optimization mode",
                       default="",
@@ -112,107 +71,328 @@ def parse_args(argv):
   parser.add_argument("-o",
                       help="Output regression file to create a new baseline",
                       type=str)
+  parser.add_argument("--catalog",
+                      help="Benchmark catalog database, refreshed incrementally and used instead of rescanning every file",
+                      type=str)
+  parser.add_argument("--family",
+                      help="Only run benchmarks from this family (directory name), requires --catalog",
+                      type=str)
+  parser.add_argument("--dimension",
+                      help="Only run benchmarks with this many variables, requires --catalog",
+                      type=int)
+  parser.add_argument("--model",
+                      help="Runtime model from 'features fit', used to estimate benchmarks without a baseline time",
+                      type=str)
+  parser.add_argument("--kill-factor",
+                      help="Kill a benchmark after this many times its estimated time, counting estimates under a second as a second and capped at this many times the timeout, 0 to never kill",
+                      type=float,
+                      default=0)
+  parser.add_argument("--fail-fast",
+                      help="Run historically fragile benchmarks first and stop after this many failing verdicts, 0 to run everything",
+                      type=int,
+                      default=0)
+  parser.add_argument("--past",
+                      help="Older regression file used to rank benchmarks for --fail-fast, may be repeated, oldest first",
+                      type=str,
+                      action="append",
+                      default=[])
+  parser.add_argument("--shard",
+                      help="Only run shard i of N (given as i/N), shards are balanced by expected run time and stable as benchmarks are added",
+                      type=str)
+  parser.add_argument("--slow-factor",
+                      help="Flag benchmarks in the live status line once they run this many times longer than their estimate",
+                      type=float,
+                      default=3.0)
+  parser.add_argument("--batch",
+                      help="Run up to this many benchmarks per invocation of tools that support batches",
+                      type=int,
+                      default=1)
+  parser.add_argument("--profile-regressions",
+                      help="After the sweep rerun FAR_WORSE benchmarks, and those slower than --slow-factor times their estimate, under --profile-wrapper",
+                      action='store_const',
+                      const=True,
+                      default=False)
+  parser.add_argument("--profile-wrapper",
+                      help="Profiler command prefix, {output} is replaced by the artifact path",
+                      type=str,
+                      default="perf record -g -o {output} --")
+  parser.add_argument("--profile-report",
+                      help="Command printing an artifact as text for the hotspot summary, {output} is replaced by the artifact path, empty for none",
+                      type=str,
+                      default="perf report --stdio --no-children -i {output}")
+  parser.add_argument("--profile-dir",
+                      help="Where to write profile artifacts, defaults to next to the -o file, required without -o",
+                      type=str)
+  parser.add_argument("--profile-top",
+                      help="Number of hotspots to show per profiled benchmark",
+                      type=int,
+                      default=5)
+  parser.add_argument("--history",
+                      help="Run history database to append this run to",
+                      type=str)
   parser.add_argument("benchmark_dir")
 
   args = parser.parse_args(args=argv[1:])
 
+  if args.tool is None:
+      args.tool = ["gelpia={}".format(args.exe)]
+  for spec in args.tool:
+      name = spec.partition("=")[0]
+      if name not in ADAPTERS:
+          parser.error("unknown tool '{}', known tools: {}".format(
+              name, ", ".join(sorted(ADAPTERS))))
+  if len(args.tool) > 1 and (args.r is not None or args.o is not None):
+      parser.error("-r and -o can only be used with a single --tool")
+  if args.catalog is None and (args.family is not None
+                               or args.dimension is not None):
+      parser.error("--family and --dimension require --catalog")
+  if args.profile_regressions and "{output}" not in args.profile_wrapper:
+      parser.error("--profile-wrapper must contain {output}")
+  if args.profile_report == "":
+      args.profile_report = None
+  if args.profile_regressions and args.profile_dir is None:
+      if args.o is None:
+          parser.error("--profile-regressions requires -o or --profile-dir")
+      args.profile_dir = args.o + ".profiles"
+  if args.shard is not None:
+      try:
+          args.shard = parse_shard(args.shard)
+      except ValueError as e:
+          parser.error(str(e))
+
   return args
 
 
+def outer_bound(t):
+    if t.mode == "MIN":
+        return t.answer_range[0]
+    return t.answer_range[1]
+
+
+def print_league_table(tools, tests):
+    '''
+    Ranks tools by how many benchmarks each answered best, a benchmark is won
+    by the non-BROKEN result with the tightest outer bound, ties going to the
+    fastest tool
+    '''
+    by_benchmark = dict()
+    for t in tests:
+        by_benchmark.setdefault(t.path, list()).append(t)
+
+    wins = {tool:0 for tool in tools}
+    for candidates in by_benchmark.values():
+        candidates = [t for t in candidates
+                      if t.strict_state in {"EXACT", "CLOSE", "FAR"}]
+        if candidates == []:
+            continue
+        sign = 1 if candidates[0].mode == "MIN" else -1
+        best = max(candidates,
+                   key=lambda t: (sign*outer_bound(t), -t.execution.elapsed))
+        wins[best.tool] += 1
+
+    rows = list()
+    for tool in tools:
+        mine = [t for t in tests if t.tool == tool]
+        strict = {k:0 for k in Test.STRICT_STATES}
+        for t in mine:
+            strict[t.strict_state] += 1
+        unanswered = sum(1 for t in mine
+                         if t.main_state in {"CRASH", "FAILED", "TIMEOUT"})
+        times = [t.execution.elapsed for t in mine
+                 if t.execution.elapsed is not None]
+        gaps = [abs(outer_bound(t) - t.expected) for t in mine
+                if t.strict_state in {"EXACT", "CLOSE", "FAR"}]
+        rows.append([tool,
+                     wins[tool],
+                     strict["EXACT"],
+                     strict["CLOSE"],
+                     strict["FAR"],
+                     strict["BROKEN"],
+                     unanswered,
+                     "{:.3g}".format(statistics.median(gaps)) if gaps else "-",
+                     "{:.2f}".format(sum(times)),
+                     "{:.2f}".format(statistics.median(times)) if times else "-"])
+    rows.sort(key=lambda r: (-r[1], r[5], float(r[8])))
+
+    header = ["Tool", "Wins", "Exact", "Close", "Far", "Broken",
+              "NoAnswer", "MedianGap", "TotalTime", "MedianTime"]
+    print("LEAGUE_TABLE")
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join(str(r) for r in row))
+    print()
+
+
+def profile_regressions(args, tests):
+    candidates = [(t, profile_reason(t, args.slow_factor)) for t in tests]
+    candidates = [(t, reason) for t, reason in candidates if reason is not None]
+    if candidates == []:
+        return []
+    profiler = WrapperProfiler(args.profile_wrapper, args.profile_report,
+                               args.profile_dir, args.profile_top)
+    if not profiler.available():
+        print("Not profiling {} benchmarks, '{}' is not available".format(
+            len(candidates), args.profile_wrapper))
+        return []
+    print("Profiling {} benchmarks into '{}'".format(len(candidates),
+                                                    args.profile_dir),
+          flush=True)
+    return [profiler.profile(t, reason) for t, reason in candidates]
+
+
+def make_units(tests, batch_size):
+    '''
+    Groups consecutive tests of tools that support batches into Batches of
+    up to batch_size, other tests are run on their own
+    '''
+    units = list()
+    open_batches = dict()
+    for t in tests:
+        if batch_size <= 1 or not t.adapter.BATCH:
+            units.append(t)
+            continue
+        batch = open_batches.get(t.adapter)
+        if batch is None or len(batch) == batch_size:
+            batch = list()
+            open_batches[t.adapter] = batch
+            units.append(batch)
+        batch.append(t)
+    return [Batch(u) if isinstance(u, list) else u for u in units]
+
+
 def main(argv):
     args = parse_args(argv)
 
     tests = list()
 
     if args.r is not None:
-        flags, timeout, mode, bound, rel_bound, benchmarks = read_regressionfile(args.r)
-
-        for filename, regression_range in benchmarks.items():
-            command = "{} --mode={} --timeout={} {} {}".format(args.exe,
-                                                               mode.lower(),
-                                                               timeout,
-                                                               flags,
-                                                               filename)
-            execution = Execution(command)
-            test = Test(execution, bound, rel_bound, timeout)
+        regression = read_regressionfile(args.r)
+        flags = regression.flags
+        timeout = regression.timeout
+        mode = regression.mode
+        bound = regression.abs_tol
+        rel_bound = regression.rel_tol
+        # The baseline's flags replace --flags, parse_args allows one --tool
+        adapter = make_adapter(args.tool[0], flags)
+        adapters = [adapter]
+
+        for filename, regression_range in regression.ranges.items():
+            test = Test(adapter, filename, mode, bound, rel_bound, timeout)
             test.set_regression(regression_range)
+            test.set_estimate(regression.elapsed[filename])
             tests.append(test)
 
     else:
-        files = glob.glob(path.join(args.benchmark_dir, "**"), recursive=True)
-        files = [f for f in files if f.endswith(".dop")]
-        files.sort()
-        for filename in files:
-            command = "{} --mode={} --timeout={} {} {}".format(args.exe,
-                                                               "min" if args.min else "max",
-                                                               args.timeout,
-                                                               args.flags,
-                                                               filename)
-            execution = Execution(command)
-            test = Test(execution, args.abs_tol, args.rel_tol, args.timeout)
-            tests.append(test)
+        adapters = [make_adapter(spec, args.flags) for spec in args.tool]
+        flags = args.flags
+        timeout = args.timeout
+        mode = "MIN" if args.min else "MAX"
+        bound = args.abs_tol
+        rel_bound = args.rel_tol
+        if args.catalog is not None:
+            catalog = Catalog(args.catalog)
+            catalog.scan(args.benchmark_dir)
+            entries = catalog.select(root=args.benchmark_dir,
+                                     family=args.family,
+                                     dimension=args.dimension)
+            catalog.close()
+            benchmarks = [(e.path, e.expected(mode)) for e in entries]
+        else:
+            files = glob.glob(path.join(args.benchmark_dir, "**"), recursive=True)
+            files = [f for f in files if f.endswith(".dop")]
+            files.sort()
+            benchmarks = [(f, None) for f in files]
+        for adapter in adapters:
+            for filename, expected in benchmarks:
+                test = Test(adapter, filename, mode, bound, rel_bound, timeout,
+                            expected)
+                tests.append(test)
+
+    if args.model is not None:
+        model = RuntimeModel.load(args.model)
+        cache = FeatureCache()
+        for t in tests:
+            if t.estimate is None:
+                t.set_estimate(predict_elapsed(model, cache, t.path,
+                                               timeout, mode))
+
+    if args.shard is not None:
+        tests = select_shard(tests, args.shard,
+                             key=lambda t: t.path,
+                             cost=lambda t: t.estimate)
+        print("Shard {}/{}".format(args.shard[0]+1, args.shard[1]))
+
+    if args.kill_factor > 0:
+        for t in tests:
+            if t.estimate is None:
+                continue
+            limit = max(t.estimate, 1.0)
+            if timeout > 0:
+                limit = min(limit, timeout)
+            t.execution.kill_after = args.kill_factor * limit
 
     total = len(tests)
     print("{} benchmarks to process".format(total))
 
-    proc_count = min(total, args.procs)
+    # Longest expected benchmarks are dispatched first so that long runs do
+    # not end up alone at the tail of the sweep
+    ordered = sorted(tests, key=lambda t: -(t.estimate or 0.0))
+    if args.fail_fast > 0:
+        past = list(args.past)
+        if args.r is not None:
+            past.append(args.r)
+        scores = fragility_scores(past)
+        ordered.sort(key=lambda t: -scores.get(t.path, 0))
+
+    units = make_units(ordered, args.batch)
+    proc_count = max(1, min(len(units), args.procs))
     print("Creating Pool with '{}' Workers\n".format(proc_count), flush=True)
-    print(Test.tsv_header(args.r is not None))
-    try:
-        with multiprocessing.Pool(processes=proc_count) as pool:
-            tests = pool.map(run_test, tests)
-    except KeyboardInterrupt as e:
-        raise e
+    show_tool = len(adapters) > 1
+    print(Test.tsv_header(args.r is not None, show_tool))
+
+    progress = None
+    if Progress.enabled():
+        progress = Progress(ordered, proc_count, args.slow_factor)
+    dispatcher = Dispatcher(proc_count, show_tool, args.fail_fast, progress)
+    dispatcher.run(units)
+
+    if dispatcher.aborted:
+        not_run = [t for t in tests if t.main_state == "NOT_RAN"]
+        print()
+        print(bold(red("FAIL_FAST: stopped after {} failing verdicts, {} of {} benchmarks not run".format(
+            dispatcher.failures, len(not_run), total))))
+        for t in not_run:
+            print("NOT_RAN\t{}".format(t.path))
+
+    print()
 
-    main_states = {k:0 for k in Test.MAIN_STATES}
-    strict_states = {k:0 for k in Test.STRICT_STATES}
-    width_states = {k:0 for k in Test.WIDTH_STATES}
-    regression_states = {k:0 for k in Test.REGRESSION_STATES}
+    profiles = list()
+    if args.profile_regressions and not dispatcher.aborted:
+        profiles = profile_regressions(args, tests)
 
-    for t in tests:
-        main_states[t.main_state] += 1
-        strict_states[t.strict_state] += 1
-        width_states[t.width_state] += 1
-        regression_states[t.regression_state] += 1
+    tools = [a.NAME for a in adapters]
+    retval = print_summaries(tools, tests, args.r is not None)
 
-    print()
+    if len(tools) > 1:
+        print_league_table(tools, tests)
+
+    print_profiles(profiles)
+
+    if args.o and dispatcher.aborted:
+        print("Not writing '{}' for an aborted sweep".format(args.o))
+    elif args.o:
+        write_regressionfile(args.o, flags, timeout, mode, bound, rel_bound,
+                             tests)
+
+    if args.history and dispatcher.aborted:
+        print("Not recording an aborted sweep in '{}'".format(args.history))
+    elif args.history:
+        history = History(args.history)
+        for adapter in adapters:
+            history.add_tests(adapter, mode, timeout, bound, rel_bound, tests)
+        history.close()
 
-    print("MAIN_STATE")
-    for k in Test.MAIN_STATES:
-        fmt = Test.MAIN_STATES_FMT[k]
-        print("{}: {}".format(fmt(k), main_states[k]))
-    main_total = sum(v for v in main_states.values())
-    print("TOTAL: {}\n".format(main_total))
-
-    print("STRICT_STATE")
-    for k in Test.STRICT_STATES:
-        fmt = Test.STRICT_STATES_FMT[k]
-        print("{}: {}".format(fmt(k), strict_states[k]))
-    strict_total = sum(v for v in strict_states.values())
-    print("TOTAL: {}\n".format(strict_total))
-
-    print("WIDTH_STATE")
-    for k in Test.WIDTH_STATES:
-        fmt = Test.WIDTH_STATES_FMT[k]
-        print("{}: {}".format(fmt(k), width_states[k]))
-    width_total = sum(v for v in width_states.values())
-    print("TOTAL: {}\n".format(width_total))
-
-    if args.r:
-        print("REGRESSION_STATE")
-        for k in Test.REGRESSION_STATES:
-            fmt = Test.REGRESSION_STATES_FMT[k]
-            print("{}: {}".format(fmt(k), regression_states[k]))
-        regression_total = sum(v for v in regression_states.values())
-        print("TOTAL: {}\n".format(regression_total))
-
-    if args.o:
-        write_regressionfile(args, tests)
-
-    return (main_states["CRASH"]
-            + main_states["FAILED"]
-            + strict_states["BROKEN"]
-            + regression_states["FAR_WORSE"])
+    return retval
 
 if __name__ == "__main__":
     try:
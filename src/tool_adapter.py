@@ -0,0 +1,148 @@
+import abc
+import re
+
+
+
+
+class ToolAdapter(abc.ABC):
+    '''
+    Describes how to drive one optimizer: how to build its command line, how
+    test modes map onto its arguments, and how to read bounds from its output.
+    '''
+    NAME = None
+    DEFAULT_EXE = None
+
+    # Test mode -> argument understood by the tool, modes not present here are
+    # not supported by the tool
+    MODE_ARGS = dict()
+
+    # Whether the tool speaks the batch protocol in batch.py
+    BATCH = False
+
+    def __init__(self, exe=None, flags=""):
+        self.exe = exe if exe is not None else self.DEFAULT_EXE
+        self.flags = flags
+
+    def supports(self, mode):
+        return mode in self.MODE_ARGS
+
+    @abc.abstractmethod
+    def command(self, filename, mode, timeout):
+        pass
+
+    def batch_command(self, filenames, mode, timeout):
+        '''
+        Command running every file in one invocation, timeout applying to
+        each file separately, only called when BATCH is set
+        '''
+        raise ValueError("{} does not run batches".format(self.NAME))
+
+    @abc.abstractmethod
+    def parse_output(self, output, mode):
+        '''
+        Returns the (lower, upper) bound pair for the given mode, with None for
+        any bound which is missing from the output
+        '''
+        pass
+
+
+
+
+class GelpiaAdapter(ToolAdapter):
+    NAME = "gelpia"
+    DEFAULT_EXE = "gelpia"
+
+    MODE_ARGS = {
+        "MIN" : "--mode=min",
+        "MAX" : "--mode=max",
+    }
+
+    BOUND_REGEX = re.compile(r"(Maximum|Minimum) (lower|upper) bound (.*)")
+
+    MODE_PREFIX = {
+        "MIN" : "Minimum",
+        "MAX" : "Maximum",
+    }
+
+    def command(self, filename, mode, timeout):
+        return "{} {} --timeout={} {} {}".format(self.exe,
+                                                 self.MODE_ARGS[mode],
+                                                 timeout,
+                                                 self.flags,
+                                                 filename)
+
+    def parse_output(self, output, mode):
+        bounds = dict()
+        for match in self.BOUND_REGEX.finditer(output):
+            key = (match.group(1), match.group(2))
+            if key not in bounds:
+                bounds[key] = float(match.group(3))
+
+        prefix = self.MODE_PREFIX[mode]
+        return (bounds.get((prefix, "lower")), bounds.get((prefix, "upper")))
+
+
+
+
+class DopAdapter(ToolAdapter):
+    NAME = "dop"
+    DEFAULT_EXE = "dOp_wrapper"
+
+    # dOp only minimizes
+    MODE_ARGS = {
+        "MIN" : "min",
+    }
+
+    BOUND_REGEX = re.compile(r"min_\d+ += +\[([^,]+), +[^\]]+\]")
+
+    def command(self, filename, mode, timeout):
+        # Argument order matches src/dOp_wrapper.sh
+        return "{} {} {} {} {}".format(self.exe,
+                                       filename,
+                                       self.MODE_ARGS[mode],
+                                       timeout,
+                                       self.flags)
+
+    def parse_output(self, output, mode):
+        # dOp reports one range per cost term, the sum of the lower ends is
+        # used as the answer
+        matches = self.BOUND_REGEX.findall(output)
+        if matches == []:
+            return (None, None)
+        res = sum(float(m) for m in matches)
+        return (res, res)
+
+
+
+
+class LocalAdapter(GelpiaAdapter):
+    '''
+    The stand-in optimizer in local_optimizer.py, which answers like gelpia
+    and supports batches
+    '''
+    NAME = "local"
+    DEFAULT_EXE = "local_optimizer"
+    BATCH = True
+
+    def batch_command(self, filenames, mode, timeout):
+        return "{} --batch {} --timeout={} {} {}".format(self.exe,
+                                                         self.MODE_ARGS[mode],
+                                                         timeout,
+                                                         self.flags,
+                                                         " ".join(filenames))
+
+
+
+
+ADAPTERS = {a.NAME : a for a in [GelpiaAdapter, DopAdapter, LocalAdapter]}
+
+
+def make_adapter(spec, flags=""):
+    '''
+    Builds an adapter from a "name" or "name=exe" specification
+    '''
+    name, _, exe = spec.partition("=")
+    if name not in ADAPTERS:
+        raise ValueError("Unknown tool '{}', known tools: {}".format(
+            name, ", ".join(sorted(ADAPTERS))))
+    return ADAPTERS[name](exe if exe != "" else None, flags)